@@ -0,0 +1,108 @@
+"""
+Codec micro-benchmark
+Per-request CPU for webhook handling (signature check + parse) and for
+serializing a page of transactions, stdlib json vs orjson.
+
+Usage:
+    python benchmarks/bench_codec.py --iterations 20000
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import codec  # noqa: E402
+
+
+SECRET = b"sk_test_benchmark"
+
+
+def webhook_body() -> bytes:
+    return json.dumps({
+        "event": "charge.success",
+        "data": {
+            "id": 302961,
+            "domain": "live",
+            "status": "success",
+            "reference": "qTPrJoy9Bx",
+            "amount": 10000,
+            "gateway_response": "Approved by Financial Institution",
+            "paid_at": "2016-09-30T21:10:19.000Z",
+            "created_at": "2016-09-30T21:09:56.000Z",
+            "channel": "card",
+            "currency": "NGN",
+            "ip_address": "41.242.49.37",
+            "metadata": {"customer_name": "Guest", "payment_date": "2016-09-30T21:09:50"},
+            "log": {"time_spent": 16, "attempts": 1, "errors": 0, "success": False, "history": []},
+            "fees": None,
+            "customer": {"id": 68324, "first_name": "BoJack", "last_name": "Horseman", "email": "bojack@horseman.com"},
+            "authorization": {"authorization_code": "AUTH_f5rnfq9p", "bin": "539999", "last4": "8877", "bank": "Guaranty Trust Bank"}
+        }
+    }).encode()
+
+
+def transactions_page(count: int) -> dict:
+    return {
+        "status": True,
+        "message": "Transactions retrieved successfully",
+        "data": [{
+            "reference": f"ref_{i:010d}",
+            "amount": 1500.5,
+            "email": f"customer{i}@example.com",
+            "status": "success",
+            "paid_at": "2024-01-01T10:00:00.000Z",
+            "channel": "card",
+            "currency": "NGN",
+            "created_at": "2024-01-01T09:59:00.000Z"
+        } for i in range(count)],
+        "meta": {"total": 10000, "page": 1, "perPage": count, "pageCount": 10000 // count}
+    }
+
+
+def cpu_per_call(fn, iterations: int) -> float:
+    began = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - began) / iterations * 1e6
+
+
+def run(iterations: int, page_size: int):
+    body = webhook_body()
+    signature = hmac.new(SECRET, body, hashlib.sha512).hexdigest()
+    page = transactions_page(page_size)
+
+    def webhook_stdlib():
+        # Before: signature check, then request.json() parses the body again
+        digest = hmac.new(SECRET, body, hashlib.sha512).hexdigest()
+        assert digest == signature
+        json.loads(body)
+
+    def webhook_codec():
+        digest = hmac.new(SECRET, body, hashlib.sha512).hexdigest()
+        assert hmac.compare_digest(digest, signature)
+        codec.loads(body)
+
+    results = [
+        ("webhook: hmac + json.loads", cpu_per_call(webhook_stdlib, iterations)),
+        (f"webhook: hmac + codec.loads ({codec.JSON_BACKEND})", cpu_per_call(webhook_codec, iterations)),
+        (f"list of {page_size}: JSONResponse", cpu_per_call(lambda: JSONResponse(content=page), iterations // 10)),
+        (f"list of {page_size}: FastJSONResponse ({codec.JSON_BACKEND})",
+         cpu_per_call(lambda: codec.FastJSONResponse(content=page), iterations // 10)),
+    ]
+    for label, micros in results:
+        print(f"{label:<46} {micros:>9.1f} us CPU/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON handling per request")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    run(args.iterations, args.page_size)
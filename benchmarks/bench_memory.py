@@ -0,0 +1,65 @@
+"""
+Memory benchmark
+Compares bytes per transaction for the original dict-of-ISO-strings
+records and the slotted Transaction record.
+
+Usage:
+    python benchmarks/bench_memory.py --count 200000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Transaction  # noqa: E402
+
+
+def make_dict(i: int, start: datetime) -> dict:
+    """A record as initialize_payment + verify_payment used to build it"""
+    created = start + timedelta(seconds=i)
+    return {
+        "reference": f"ref_{i:010d}",
+        "email": f"customer{i}@example.com",
+        "amount": float(1000 + i % 5000),
+        "name": "Guest",
+        "status": "success",
+        "created_at": created.isoformat(),
+        "verified_at": (created + timedelta(seconds=30)).isoformat(),
+        "gateway_response": "Successful",
+        "paid_at": (created + timedelta(seconds=20)).isoformat() + "Z",
+        "channel": "card"
+    }
+
+
+def measure(label: str, build, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = {}
+    for i in range(count):
+        record = build(i)
+        records[record["reference"] if isinstance(record, dict) else record.reference] = record
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    per_record = (after - before) / count
+    print(f"{label:<34} {per_record:>8.0f} bytes/transaction")
+    return per_record
+
+
+def run(count: int):
+    start = datetime(2024, 1, 1)
+    # Inputs are built per record so both sides pay for their own strings
+    before = measure("dict of ISO strings (before)", lambda i: make_dict(i, start), count)
+    after = measure("slotted Transaction (after)", lambda i: Transaction.from_dict(make_dict(i, start)), count)
+    print(f"{'saving':<34} {before - after:>8.0f} bytes/transaction ({(1 - after / before) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-transaction memory usage")
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args()
+    run(args.count)
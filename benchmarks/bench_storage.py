@@ -0,0 +1,113 @@
+"""
+Storage benchmark
+Measures insert, update and range-query throughput of the transaction
+store backends.
+
+Usage:
+    python benchmarks/bench_storage.py --rows 1000000
+    python benchmarks/bench_storage.py --backend memory --rows 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import create_store  # noqa: E402
+
+
+STATUSES = ["pending", "success", "failed", "abandoned"]
+
+
+def make_records(count: int, start: datetime):
+    for i in range(count):
+        yield {
+            "reference": f"ref_{i:010d}",
+            "email": f"customer{i % 50000}@example.com",
+            "amount": float(random.randint(100, 500000)),
+            "name": "Guest",
+            "status": "pending",
+            "created_at": (start + timedelta(seconds=i)).isoformat()
+        }
+
+
+def report(label: str, operations: int, elapsed: float):
+    print(f"{label:<28} {operations:>10,} ops  {elapsed:8.2f}s  {operations / elapsed:>12,.0f} ops/s")
+
+
+def run(backend: str, rows: int, batch_size: int, queries: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    store = create_store(backend, path)
+    start = datetime(2024, 1, 1)
+    print(f"Backend: {backend}  rows: {rows:,}  batch: {batch_size:,}")
+
+    # Batched inserts
+    began = time.perf_counter()
+    batch = []
+    for record in make_records(rows, start):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            store.insert_many(batch)
+            batch = []
+    if batch:
+        store.insert_many(batch)
+    report("insert (batched)", rows, time.perf_counter() - began)
+
+    # Single-row updates, as verify/webhook handlers do
+    sample = [f"ref_{random.randrange(rows):010d}" for _ in range(queries)]
+    began = time.perf_counter()
+    for reference in sample:
+        store.update(reference, status="success", channel="card")
+    report("update (single row)", len(sample), time.perf_counter() - began)
+
+    # Batched updates
+    updates = [(f"ref_{random.randrange(rows):010d}", {"status": random.choice(STATUSES)}) for _ in range(rows // 10)]
+    began = time.perf_counter()
+    for i in range(0, len(updates), batch_size):
+        store.update_many(updates[i:i + batch_size])
+    report("update (batched)", len(updates), time.perf_counter() - began)
+
+    # Point lookups by reference
+    began = time.perf_counter()
+    for reference in sample:
+        store.get(reference)
+    report("get by reference", len(sample), time.perf_counter() - began)
+
+    # created_at range queries (one hour windows)
+    began = time.perf_counter()
+    for _ in range(queries):
+        offset = random.randrange(rows)
+        window_start = start + timedelta(seconds=offset)
+        store.list(
+            limit=100,
+            created_from=window_start.isoformat(),
+            created_to=(window_start + timedelta(hours=1)).isoformat()
+        )
+    report("range query (limit 100)", queries, time.perf_counter() - began)
+
+    # Lookups by email and status
+    began = time.perf_counter()
+    for i in range(queries):
+        store.list(limit=20, email=f"customer{i % 50000}@example.com")
+    report("list by email", queries, time.perf_counter() - began)
+
+    began = time.perf_counter()
+    for _ in range(queries // 10 or 1):
+        store.list(limit=100, status="pending")
+    report("list by status", queries // 10 or 1, time.perf_counter() - began)
+
+    store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark transaction storage backends")
+    parser.add_argument("--backend", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=10000)
+    args = parser.parse_args()
+    run(args.backend, args.rows, args.batch_size, args.queries)
@@ -0,0 +1,126 @@
+"""
+In-process caches
+Bounded LRU cache with per-entry TTL and hit/miss counters,
+plus single-flight coalescing of concurrent identical calls
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from models import TERMINAL_STATUSES
+
+
+class TTLCache:
+    """LRU cache where each entry may carry its own time-to-live"""
+
+    def __init__(self, max_size: int = 10000, default_ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = ...):
+        """Store a value; ttl=None keeps it until evicted"""
+        if ttl is ...:
+            ttl = self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> bool:
+        """Drop a single entry, returning True if it was present"""
+        return self._data.pop(key, None) is not None
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class VerificationCache(TTLCache):
+    """Caches verify results: terminal states forever, others for a short TTL"""
+
+    def __init__(self, max_size: int = 10000, pending_ttl: float = 5.0):
+        super().__init__(max_size=max_size, default_ttl=pending_ttl)
+
+    def store(self, reference: str, result: dict):
+        ttl = None if result.get("status") in TERMINAL_STATUSES else self.default_ttl
+        self.set(reference, result, ttl=ttl)
+
+    def on_status_change(self, reference: str, status: Optional[str]):
+        """Drop the cached result if the stored status moved away from it"""
+        entry = self._data.get(reference)
+        if entry is not None and entry[0].get("status") != status:
+            del self._data[reference]
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight task"""
+
+    def __init__(self):
+        self._calls: dict = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() once per key at a time; concurrent callers share its result"""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.shared += 1
+
+        # Shield so one cancelled caller does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when every caller went away
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared
+        }
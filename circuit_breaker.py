@@ -0,0 +1,134 @@
+"""
+Upstream circuit breaker
+Per-endpoint closed / open / half-open breaker with a timeout that adapts
+to a rolling latency percentile
+"""
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Paystack {name} is unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast for
+    `reset_timeout` seconds. Then one probe call is let through (half-open):
+    success closes the breaker, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_timeout: float = 15.0,
+        min_timeout: float = 2.0,
+        percentile: float = 99.0,
+        multiplier: float = 3.0,
+        window: int = 200,
+        min_samples: int = 20
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+        self._latencies: deque = deque(maxlen=window)
+        self._timeout = max_timeout
+        self._samples_since_refresh = 0
+        self.trips = 0
+        self.rejected = 0
+        self.transitions = defaultdict(int)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.transitions[f"{self.state}->{state}"] += 1
+            self.state = state
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            remaining = self.opened_at + self.reset_timeout - now
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            # One probe at a time; a probe that never reported back is replaced
+            if self._probe_started_at is not None and now - self._probe_started_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probe_started_at = now
+
+    def record_success(self, latency: float):
+        self.consecutive_failures = 0
+        self._probe_started_at = None
+        self._transition(CLOSED)
+        self._latencies.append(latency)
+        self._samples_since_refresh += 1
+        if self._samples_since_refresh >= 10:
+            self._refresh_timeout()
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_started_at = None
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self._transition(OPEN)
+            self.opened_at = time.monotonic()
+
+    def _refresh_timeout(self):
+        self._samples_since_refresh = 0
+        observed = self.latency(self.percentile)
+        if observed is not None:
+            self._timeout = min(self.max_timeout, max(self.min_timeout, observed * self.multiplier))
+
+    def latency(self, percentile: float) -> Optional[float]:
+        """Observed latency percentile in seconds, or None with too few samples"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    @property
+    def timeout(self) -> float:
+        """Current per-call timeout in seconds"""
+        return self._timeout
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic()) if self.state == OPEN else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "consecutive_failures": self.consecutive_failures,
+            "transitions": dict(self.transitions),
+            "timeout_seconds": round(self._timeout, 3),
+            "latency_samples": len(self._latencies)
+        }
@@ -0,0 +1,41 @@
+"""
+JSON codec
+Uses orjson when it is installed and falls back to the standard library
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: bytes) -> Any:
+    """Parse JSON from bytes (or str)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered through the fastest available encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
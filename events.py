@@ -0,0 +1,108 @@
+"""
+Payment status push
+Fan-out of status transitions to Server-Sent Events subscribers, either
+for one reference or for all transactions
+"""
+import asyncio
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Optional, Set
+
+from codec import dumps_str
+
+
+class Subscriber:
+    """One connected client with a small bounded buffer"""
+
+    __slots__ = ("reference", "queue", "dropped")
+
+    def __init__(self, reference: Optional[str], buffer_size: int):
+        self.reference = reference
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, message: dict):
+        """Enqueue without blocking; a slow client loses its oldest update"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class StatusBroker:
+    """Publishes status updates to subscribers of a reference and of everything"""
+
+    def __init__(self, buffer_size: int = 16, max_subscribers: int = 50000, keepalive: float = 15.0):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.keepalive = keepalive
+        self._by_reference: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self._all: Set[Subscriber] = set()
+        self.subscriber_count = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, reference: Optional[str] = None) -> Subscriber:
+        if self.full:
+            raise OverflowError("Too many subscribers")
+        subscriber = Subscriber(reference, self.buffer_size)
+        if reference is None:
+            self._all.add(subscriber)
+        else:
+            self._by_reference[reference].add(subscriber)
+        self.subscriber_count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.dropped += subscriber.dropped
+        if subscriber.reference is None:
+            subscribers = self._all
+        else:
+            subscribers = self._by_reference.get(subscriber.reference, set())
+        if subscriber in subscribers:
+            subscribers.discard(subscriber)
+            self.subscriber_count -= 1
+        if subscriber.reference is not None and not subscribers:
+            self._by_reference.pop(subscriber.reference, None)
+
+    def publish(self, reference: Optional[str], status: Optional[str], source: str, **extra):
+        """Push a status update to interested subscribers"""
+        if not reference or not status:
+            return
+        self.published += 1
+        message = {"reference": reference, "status": status, "source": source, "at": time.time(), **extra}
+        for subscriber in self._by_reference.get(reference, ()):
+            subscriber.offer(message)
+            self.delivered += 1
+        for subscriber in self._all:
+            subscriber.offer(message)
+            self.delivered += 1
+
+    @property
+    def full(self) -> bool:
+        return self.subscriber_count >= self.max_subscribers
+
+    async def stream(self, reference: Optional[str] = None) -> AsyncIterator[str]:
+        """SSE frames for a new subscriber, with keep-alive comments while idle"""
+        subscriber = self.subscribe(reference)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: status\ndata: {dumps_str(message)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscriber_count,
+            "references_watched": len(self._by_reference),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped + sum(s.dropped for s in self._all)
+        }
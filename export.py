@@ -0,0 +1,102 @@
+"""
+Paged export helpers
+Walks every page of a Paystack listing with a sliding prefetch window
+"""
+import asyncio
+import csv
+import io
+import itertools
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+
+from codec import dumps
+
+
+EXPORT_FIELDS = ["reference", "amount", "email", "status", "paid_at", "channel", "currency"]
+
+_export_ids = itertools.count(1)
+
+
+async def iter_pages(
+    fetch_page: Callable[[dict], Awaitable[dict]],
+    params: dict,
+    window: int = 4
+) -> AsyncIterator[dict]:
+    """
+    Yield every page in order. Page 1 tells us meta.pageCount; later pages
+    are fetched concurrently, at most `window` ahead of the consumer.
+    """
+    first = await fetch_page({**params, "page": 1})
+    yield first
+
+    page_count = int(first.get("meta", {}).get("pageCount") or 1)
+    pending: deque = deque()
+    next_page = 2
+
+    def schedule():
+        nonlocal next_page
+        while next_page <= page_count and len(pending) < window:
+            pending.append(asyncio.ensure_future(fetch_page({**params, "page": next_page})))
+            next_page += 1
+
+    try:
+        schedule()
+        while pending:
+            page = await pending.popleft()
+            schedule()
+            yield page
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def to_ndjson(records: List[dict]) -> bytes:
+    return b"".join(dumps(record) + b"\n" for record in records)
+
+
+def to_csv(records: List[dict], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+
+class ExportProgress:
+    """Tracks running exports so their progress can be reported"""
+
+    def __init__(self):
+        self.active: Dict[int, dict] = {}
+        self.completed = 0
+
+    def start(self, filters: dict) -> int:
+        export_id = next(_export_ids)
+        self.active[export_id] = {
+            "filters": filters,
+            "pages_done": 0,
+            "page_count": None,
+            "records": 0,
+            "started_at": time.time()
+        }
+        return export_id
+
+    def page_done(self, export_id: int, page: dict):
+        progress = self.active.get(export_id)
+        if progress is None:
+            return
+        progress["pages_done"] += 1
+        progress["records"] += len(page["data"])
+        if progress["page_count"] is None:
+            progress["page_count"] = page.get("meta", {}).get("pageCount")
+
+    def finish(self, export_id: int):
+        if self.active.pop(export_id, None) is not None:
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "active": {str(k): dict(v) for k, v in self.active.items()},
+            "completed": self.completed
+        }
@@ -1,23 +1,46 @@
-from fastapi import FastAPI, Request, HTTPException, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, HTTPException, Form, Header, Query
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import requests
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, ValidationError
+import asyncio
+import csv
+import io
 import os
 from dotenv import load_dotenv
 import hmac
 import hashlib
-from datetime import datetime
-from typing import Optional
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from paystack_client import PaystackClient
+from references import ReferenceGenerator
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from rate_limiter import BACKGROUND, CHECKOUT, VERIFY, OutboundScheduler, QueueFullError
+from retry import UNDELIVERED_ERRORS, Hedger, RetryPolicy
+from reconciler import PendingReconciler
+from reconciliation import RUNNING, ReconciliationJob, describe, load_state, report_dir, report_id, report_running
+from codec import JSON_BACKEND, FastJSONResponse, dumps, loads
+from models import from_epoch_ms, to_epoch_ms
+from cache import SingleFlight, TTLCache, VerificationCache
+from export import ExportProgress, iter_pages, to_csv, to_ndjson
+from sync import SyncEngine, TransactionMirror
+from storage import SQLiteTransactionStore, TieredTransactionStore, create_store
+from shared_state import CachedTransactionStore, ChangeFeed
+from events import StatusBroker
+from webhooks import EventDeduplicator, EventRouter, WebhookProcessor, WebhookQueue
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Paystack Payment Integration", version="1.0.0")
-
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+logger = logging.getLogger(__name__)
 
 # Paystack Configuration
 PAYSTACK_SECRET_KEY = os.getenv("PAYSTACK_SECRET_KEY")
@@ -25,9 +48,219 @@ PAYSTACK_PUBLIC_KEY = os.getenv("PAYSTACK_PUBLIC_KEY")
 PAYSTACK_BASE_URL = os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")
 APP_URL = os.getenv("APP_URL", "http://localhost:8000")
 
-# In-memory storage for demo (use database in production)
-transactions = {}
-customers = {}
+# Prefix for locally generated transaction references
+REFERENCE_PREFIX = os.getenv("REFERENCE_PREFIX", "")
+
+# Storage configuration ("memory", "sqlite" or "tiered")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "transactions.db")
+COLD_TIER_PATH = os.getenv("COLD_TIER_PATH", "transactions_cold.db")
+HOT_TIER_MAX_SIZE = int(os.getenv("HOT_TIER_MAX_SIZE", "100000"))
+HOT_TIER_PENDING_MAX_AGE = float(os.getenv("HOT_TIER_PENDING_MAX_AGE", "3600"))
+HOT_TIER_TERMINAL_MAX_AGE = float(os.getenv("HOT_TIER_TERMINAL_MAX_AGE", "600"))
+HOT_TIER_SWEEP_INTERVAL = float(os.getenv("HOT_TIER_SWEEP_INTERVAL", "60"))
+STORE_CACHE_SIZE = int(os.getenv("STORE_CACHE_SIZE", "10000"))
+STORE_CHANGE_POLL_INTERVAL = float(os.getenv("STORE_CHANGE_POLL_INTERVAL", "0.5"))
+
+# Paystack HTTP client configuration
+PAYSTACK_MAX_CONNECTIONS = int(os.getenv("PAYSTACK_MAX_CONNECTIONS", "200"))
+PAYSTACK_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("PAYSTACK_MAX_KEEPALIVE_CONNECTIONS", "50"))
+PAYSTACK_TIMEOUT = float(os.getenv("PAYSTACK_TIMEOUT", "15"))
+PAYSTACK_CONNECT_TIMEOUT = float(os.getenv("PAYSTACK_CONNECT_TIMEOUT", "5"))
+PAYSTACK_INITIALIZE_TIMEOUT = float(os.getenv("PAYSTACK_INITIALIZE_TIMEOUT", str(PAYSTACK_TIMEOUT)))
+PAYSTACK_VERIFY_TIMEOUT = float(os.getenv("PAYSTACK_VERIFY_TIMEOUT", str(PAYSTACK_TIMEOUT)))
+PAYSTACK_LIST_TIMEOUT = float(os.getenv("PAYSTACK_LIST_TIMEOUT", str(PAYSTACK_TIMEOUT)))
+
+# Circuit breakers and adaptive timeouts (the PAYSTACK_*_TIMEOUT values above
+# are the ceilings; timeouts shrink towards a multiple of observed latency)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "2"))
+ADAPTIVE_TIMEOUT_PERCENTILE = float(os.getenv("ADAPTIVE_TIMEOUT_PERCENTILE", "99"))
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", "3"))
+
+# Outbound rate limit shared by all Paystack calls (checkout > verify > background).
+# The limit is for the whole deployment; each of the WEB_CONCURRENCY worker
+# processes (uvicorn's worker count setting) gets an equal share.
+PAYSTACK_RATE_LIMIT = float(os.getenv("PAYSTACK_RATE_LIMIT", "50"))
+PAYSTACK_RATE_BURST = int(os.getenv("PAYSTACK_RATE_BURST", "100"))
+WORKER_COUNT = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+PAYSTACK_MAX_QUEUED = int(os.getenv("PAYSTACK_MAX_QUEUED", "1000"))
+PAYSTACK_BACKGROUND_RESERVE = float(os.getenv("PAYSTACK_BACKGROUND_RESERVE", "0.2"))
+PAYSTACK_DEFAULT_RETRY_AFTER = float(os.getenv("PAYSTACK_DEFAULT_RETRY_AFTER", "1"))
+
+# Retries (exponential backoff, full jitter) for idempotent Paystack calls;
+# initialize is only retried when it carries its own reference
+PAYSTACK_RETRY_ATTEMPTS = int(os.getenv("PAYSTACK_RETRY_ATTEMPTS", "3"))
+PAYSTACK_RETRY_BASE_DELAY = float(os.getenv("PAYSTACK_RETRY_BASE_DELAY", "0.1"))
+PAYSTACK_RETRY_MAX_DELAY = float(os.getenv("PAYSTACK_RETRY_MAX_DELAY", "2"))
+PAYSTACK_RETRY_BUDGET = float(os.getenv("PAYSTACK_RETRY_BUDGET", "5"))
+
+# Hedged verification: a second verify once the first is slower than the
+# observed p95, limited to VERIFY_HEDGE_BUDGET of verify calls
+VERIFY_HEDGE_ENABLED = os.getenv("VERIFY_HEDGE_ENABLED", "true").lower() == "true"
+VERIFY_HEDGE_BUDGET = float(os.getenv("VERIFY_HEDGE_BUDGET", "0.05"))
+VERIFY_HEDGE_MIN_DELAY = float(os.getenv("VERIFY_HEDGE_MIN_DELAY", "0.05"))
+
+# Verification cache configuration
+VERIFY_CACHE_MAX_SIZE = int(os.getenv("VERIFY_CACHE_MAX_SIZE", "10000"))
+VERIFY_CACHE_PENDING_TTL = float(os.getenv("VERIFY_CACHE_PENDING_TTL", "5"))
+
+# Webhook-first verification: answer from a signed charge.success already
+# applied locally, re-checking upstream once the confirmation is this old.
+# Off without a secret key, since webhooks cannot be authenticated then.
+VERIFY_WEBHOOK_FIRST = os.getenv("VERIFY_WEBHOOK_FIRST", "true").lower() == "true" and bool(PAYSTACK_SECRET_KEY)
+VERIFY_WEBHOOK_RECHECK_AFTER = float(os.getenv("VERIFY_WEBHOOK_RECHECK_AFTER", "3600"))
+
+# Seconds /payment-callback waits for verification before leaving it to the browser (0 = never wait)
+CALLBACK_VERIFY_DEADLINE = float(os.getenv("CALLBACK_VERIFY_DEADLINE", "2"))
+
+# Idempotency-Key support on initialize (first successful response is replayed)
+IDEMPOTENCY_CACHE_MAX_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_MAX_SIZE", "10000"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+# Bulk initialization configuration
+BULK_INITIALIZE_CONCURRENCY = int(os.getenv("BULK_INITIALIZE_CONCURRENCY", "10"))
+BULK_INITIALIZE_MAX_ITEMS = int(os.getenv("BULK_INITIALIZE_MAX_ITEMS", "10000"))
+BULK_RECORD_BATCH = 500  # pending records written per batch before their upstream calls
+
+# Batch verification configuration
+BATCH_VERIFY_CONCURRENCY = int(os.getenv("BATCH_VERIFY_CONCURRENCY", "20"))
+BATCH_VERIFY_MAX_REFERENCES = int(os.getenv("BATCH_VERIFY_MAX_REFERENCES", "1000"))
+
+# Transaction export configuration
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "100"))
+EXPORT_PREFETCH_PAGES = int(os.getenv("EXPORT_PREFETCH_PAGES", "4"))
+
+# Reconciliation report configuration
+RECONCILE_REPORT_DIR = os.getenv("RECONCILE_REPORT_DIR", "reconciliation_reports")
+RECONCILE_REPORT_WINDOW = float(os.getenv("RECONCILE_REPORT_WINDOW", "86400"))
+RECONCILE_REPORT_SLACK = float(os.getenv("RECONCILE_REPORT_SLACK", "3600"))
+RECONCILE_REPORT_BATCH_SIZE = int(os.getenv("RECONCILE_REPORT_BATCH_SIZE", "1000"))
+
+# Webhook queue configuration
+WEBHOOK_QUEUE_PATH = os.getenv("WEBHOOK_QUEUE_PATH", "webhook_queue.db")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "30"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "10"))
+WEBHOOK_DEDUPE_WINDOW = float(os.getenv("WEBHOOK_DEDUPE_WINDOW", "86400"))
+WEBHOOK_DEDUPE_MAX_KEYS = int(os.getenv("WEBHOOK_DEDUPE_MAX_KEYS", "1000000"))
+WEBHOOK_HANDLER_TIMEOUT = float(os.getenv("WEBHOOK_HANDLER_TIMEOUT", "5"))
+
+# Status push (Server-Sent Events) configuration
+SSE_SUBSCRIBER_BUFFER = int(os.getenv("SSE_SUBSCRIBER_BUFFER", "16"))
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "50000"))
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+
+# Local transaction mirror configuration
+MIRROR_SYNC_ENABLED = os.getenv("MIRROR_SYNC_ENABLED", "true").lower() == "true"
+MIRROR_SYNC_INTERVAL = float(os.getenv("MIRROR_SYNC_INTERVAL", "30"))
+MIRROR_SYNC_PAGE_SIZE = int(os.getenv("MIRROR_SYNC_PAGE_SIZE", "100"))
+MIRROR_SYNC_OVERLAP = float(os.getenv("MIRROR_SYNC_OVERLAP", "3600"))
+
+# Stale pending reconciliation (re-verify records no webhook resolved)
+RECONCILE_ENABLED = os.getenv("RECONCILE_ENABLED", "true").lower() == "true"
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "60"))
+RECONCILE_STALE_AFTER = float(os.getenv("RECONCILE_STALE_AFTER", "900"))
+RECONCILE_MAX_AGE = float(os.getenv("RECONCILE_MAX_AGE", "604800"))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "100"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "5"))
+RECONCILE_BASE_BACKOFF = float(os.getenv("RECONCILE_BASE_BACKOFF", "300"))
+RECONCILE_MAX_BACKOFF = float(os.getenv("RECONCILE_MAX_BACKOFF", "21600"))
+
+# Local transaction records (in-memory for the demo, SQLite for persistence,
+# or a bounded in-memory hot tier that spills to a SQLite cold tier)
+if STORAGE_BACKEND == "tiered":
+    backend_store = create_store(
+        "tiered",
+        COLD_TIER_PATH,
+        max_size=HOT_TIER_MAX_SIZE,
+        pending_max_age=HOT_TIER_PENDING_MAX_AGE,
+        terminal_max_age=HOT_TIER_TERMINAL_MAX_AGE
+    )
+else:
+    backend_store = create_store(STORAGE_BACKEND, SQLITE_PATH)
+
+# Verify results keyed by reference (terminal states are kept until evicted)
+verify_cache = VerificationCache(max_size=VERIFY_CACHE_MAX_SIZE, pending_ttl=VERIFY_CACHE_PENDING_TTL)
+
+# Pushes status transitions to browsers subscribed over SSE
+status_broker = StatusBroker(
+    buffer_size=SSE_SUBSCRIBER_BUFFER,
+    max_subscribers=SSE_MAX_SUBSCRIBERS,
+    keepalive=SSE_KEEPALIVE
+)
+
+# With SQLite, all workers share one store; each keeps a local cache of hot
+# records that the change feed invalidates when another worker writes
+if isinstance(backend_store, SQLiteTransactionStore):
+    store = CachedTransactionStore(backend_store, max_size=STORE_CACHE_SIZE)
+    change_feed = ChangeFeed(backend_store, interval=STORE_CHANGE_POLL_INTERVAL)
+    change_feed.subscribe(store.invalidate)
+    change_feed.subscribe(verify_cache.on_status_change)
+    change_feed.subscribe(lambda reference, status: status_broker.publish(reference, status, "store"))
+else:
+    store = backend_store
+    change_feed = None
+
+# SQLite writes are thread-safe and hit disk, so they run off the event loop
+OFFLOAD_STORE_WRITES = isinstance(backend_store, SQLiteTransactionStore)
+
+# Sortable, collision-resistant references minted before calling Paystack
+new_reference = ReferenceGenerator(prefix=REFERENCE_PREFIX)
+
+# Coalesce concurrent identical upstream calls
+verify_flight = SingleFlight()
+list_flight = SingleFlight()
+initialize_flight = SingleFlight()
+
+# Initialize responses by Idempotency-Key, with the request they answered
+idempotency_cache = TTLCache(max_size=IDEMPOTENCY_CACHE_MAX_SIZE, default_ttl=IDEMPOTENCY_TTL)
+idempotency_stats = {"replayed": 0, "conflicts": 0}
+
+# Bulk initialization counters
+bulk_initialize_stats = {"batches": 0, "initialized": 0, "failed": 0}
+
+# Where verify answers came from ("cache", "webhook", "paystack") and
+# background upstream double-checks of webhook-confirmed answers
+verify_sources = defaultdict(int)
+verify_rechecks = {"started": 0, "failed": 0}
+_recheck_tasks = set()
+
+# Callback pages rendered with the result embedded vs. left to the browser
+callback_verifications = {"embedded": 0, "deadline_missed": 0, "failed": 0}
+
+# Running transaction exports
+export_progress = ExportProgress()
+
+# Local mirror of Paystack transactions, kept fresh by the sync engine
+mirror = TransactionMirror()
+
+
+def mirror_store_change(reference: str, status: Optional[str]):
+    """Apply a write made by another worker to this worker's mirror"""
+    if status is None:
+        mirror.remove(reference)
+        return
+    if mirror.get(reference) is not None:
+        mirror.upsert({"reference": reference, "status": status})
+        return
+    record = store.get(reference)
+    if record is not None:
+        mirror.upsert({
+            "reference": reference,
+            "amount": record.get("amount"),
+            "email": record.get("email"),
+            "status": record.get("status"),
+            "paid_at": record.get("paid_at"),
+            "channel": record.get("channel"),
+            "currency": "NGN",
+            "created_at": record.get("created_at")
+        })
+
+
+if change_feed is not None:
+    change_feed.subscribe(mirror_store_change)
 
 
 def get_paystack_headers():
@@ -38,6 +271,162 @@ def get_paystack_headers():
     }
 
 
+# Shared Paystack client (headers are built once, connections are pooled)
+paystack = PaystackClient(
+    base_url=PAYSTACK_BASE_URL,
+    headers=get_paystack_headers(),
+    max_connections=PAYSTACK_MAX_CONNECTIONS,
+    max_keepalive_connections=PAYSTACK_MAX_KEEPALIVE_CONNECTIONS,
+    timeout=PAYSTACK_TIMEOUT,
+    connect_timeout=PAYSTACK_CONNECT_TIMEOUT
+)
+
+
+# One breaker per Paystack endpoint, so a failing listing cannot block checkout
+breakers = {
+    endpoint: CircuitBreaker(
+        endpoint,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_TIMEOUT,
+        max_timeout=max_timeout,
+        min_timeout=min(ADAPTIVE_TIMEOUT_MIN, max_timeout),
+        percentile=ADAPTIVE_TIMEOUT_PERCENTILE,
+        multiplier=ADAPTIVE_TIMEOUT_MULTIPLIER
+    )
+    for endpoint, max_timeout in (
+        ("initialize", PAYSTACK_INITIALIZE_TIMEOUT),
+        ("verify", PAYSTACK_VERIFY_TIMEOUT),
+        ("list", PAYSTACK_LIST_TIMEOUT)
+    )
+}
+
+
+# This worker's share of the outbound Paystack token bucket, handed out by priority
+scheduler = OutboundScheduler(
+    rate=PAYSTACK_RATE_LIMIT / WORKER_COUNT,
+    burst=max(1, PAYSTACK_RATE_BURST // WORKER_COUNT),
+    max_waiting=PAYSTACK_MAX_QUEUED,
+    background_reserve=PAYSTACK_BACKGROUND_RESERVE
+)
+
+# Retry policies per endpoint and the verify hedger. Initialize is not
+# idempotent (a repeat after Paystack committed gets "Duplicate Transaction
+# Reference"), so it only retries calls that provably never arrived.
+retry_settings = {
+    "max_attempts": PAYSTACK_RETRY_ATTEMPTS,
+    "base_delay": PAYSTACK_RETRY_BASE_DELAY,
+    "max_delay": PAYSTACK_RETRY_MAX_DELAY,
+    "budget": PAYSTACK_RETRY_BUDGET
+}
+retry_policies = {
+    "initialize": RetryPolicy(**retry_settings, retry_on=UNDELIVERED_ERRORS, retry_statuses=frozenset({429})),
+    "verify": RetryPolicy(**retry_settings),
+    "list": RetryPolicy(**retry_settings)
+}
+verify_hedger = Hedger(budget_ratio=VERIFY_HEDGE_BUDGET)
+
+# Errors meaning Paystack cannot be called right now (answered with 503)
+UPSTREAM_UNAVAILABLE = (CircuitOpenError, QueueFullError)
+
+
+async def paystack_call(
+    endpoint: str,
+    send: Callable[[float], Awaitable[httpx.Response]],
+    priority: str = BACKGROUND
+) -> httpx.Response:
+    """
+    Call Paystack through the endpoint's circuit breaker and the outbound
+    scheduler. `send` gets the current adaptive timeout. Transport errors,
+    timeouts and 5xx responses count as breaker failures; a 429 pauses all
+    outbound traffic for its Retry-After.
+    """
+    breaker = breakers[endpoint]
+    breaker.before_call()
+    await scheduler.acquire(priority)
+    began = time.perf_counter()
+    try:
+        response = await send(breaker.timeout)
+    except httpx.HTTPError:
+        breaker.record_failure()
+        raise
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success(time.perf_counter() - began)
+    if response.status_code == 429:
+        try:
+            retry_after = float(response.headers.get("retry-after") or PAYSTACK_DEFAULT_RETRY_AFTER)
+        except ValueError:
+            retry_after = PAYSTACK_DEFAULT_RETRY_AFTER  # HTTP-date form
+        scheduler.pause(retry_after)
+    return response
+
+
+def hedge_delay() -> Optional[float]:
+    """How long a verify may run before it is hedged (None: do not hedge)"""
+    if not VERIFY_HEDGE_ENABLED:
+        return None
+    p95 = breakers["verify"].latency(95)
+    return max(VERIFY_HEDGE_MIN_DELAY, p95) if p95 is not None else None
+
+
+def unavailable(error) -> HTTPException:
+    """503 telling the client when Paystack can next be called"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(max(1, round(error.retry_after)))}
+    )
+
+
+async def sweep_hot_tier():
+    """Periodically spill aged-out records from the hot tier to disk"""
+    while True:
+        await asyncio.sleep(HOT_TIER_SWEEP_INTERVAL)
+        store.sweep()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the Paystack connection pool on startup and close it on shutdown"""
+    await paystack.start()
+    if MIRROR_SYNC_ENABLED:
+        sync_engine.start()
+    if RECONCILE_ENABLED:
+        reconciler.start()
+    if change_feed is not None:
+        change_feed.start()
+    sweeper = asyncio.create_task(sweep_hot_tier()) if isinstance(store, TieredTransactionStore) else None
+    webhook_processor.start()
+    yield
+    await webhook_processor.stop()
+    webhook_processor.queue.close()
+    if sweeper is not None:
+        sweeper.cancel()
+    if change_feed is not None:
+        await change_feed.stop()
+    await reconciler.stop()
+    if isinstance(backend_store, SQLiteTransactionStore):
+        backend_store.release_lease(RECONCILE_LEASE, RECONCILE_LEASE_OWNER)
+    for job in reconciliation_jobs.values():
+        await job.stop()
+    await sync_engine.stop()
+    await paystack.close()
+    store.close()
+
+
+app = FastAPI(
+    title="Paystack Payment Integration",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
+
+# Mount static files and templates
+app.mount("/static", StaticFiles(directory="static"), name="static")
+templates = Jinja2Templates(directory="templates")
+
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Home page with payment form"""
@@ -58,7 +447,7 @@ async def transactions_page(request: Request):
         "transactions.html",
         {
             "request": request,
-            "transactions": list(transactions.values())
+            "transactions": store.list(limit=100)
         }
     )
 
@@ -67,61 +456,589 @@ async def transactions_page(request: Request):
 async def initialize_payment(
     email: str = Form(...),
     amount: float = Form(...),
-    name: Optional[str] = Form(None)
+    name: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     API 1: Initialize Transaction
     Creates a new payment transaction and returns authorization URL
     """
+    if idempotency_key is not None:
+        return await initialize_idempotent(idempotency_key, email, amount, name)
+    
     try:
-        # Paystack expects amount in kobo (smallest currency unit)
-        amount_in_kobo = int(amount * 100)
+        data = await create_transaction(email, amount, name)
         
-        # Prepare request payload
-        payload = {
-            "email": email,
-            "amount": amount_in_kobo,
-            "currency": "NGN",
-            "callback_url": f"{APP_URL}/payment-callback",
-            "metadata": {
-                "customer_name": name or "Guest",
-                "payment_date": datetime.now().isoformat()
-            }
+        return FastJSONResponse(content={
+            "status": True,
+            "message": "Transaction initialized successfully",
+            "data": data
+        })
+            
+    except HTTPException:
+        raise
+    except UPSTREAM_UNAVAILABLE as e:
+        raise unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def initialize_upstream(
+    email: str,
+    amount: float,
+    name: Optional[str],
+    metadata: Optional[dict] = None,
+    reference: Optional[str] = None,
+    priority: str = CHECKOUT
+) -> dict:
+    """Initialize a transaction with Paystack, returning its data (reference, authorization_url)"""
+    # Paystack expects amount in kobo (smallest currency unit)
+    amount_in_kobo = int(amount * 100)
+    
+    # Prepare request payload
+    payload = {
+        "email": email,
+        "amount": amount_in_kobo,
+        "currency": "NGN",
+        "callback_url": f"{APP_URL}/payment-callback",
+        "metadata": {
+            "customer_name": name or "Guest",
+            "payment_date": datetime.now().isoformat(),
+            **(metadata or {})
         }
-        
-        # Call Paystack Initialize Transaction API
-        response = requests.post(
-            f"{PAYSTACK_BASE_URL}/transaction/initialize",
-            json=payload,
-            headers=get_paystack_headers()
+    }
+    if reference is not None:
+        payload["reference"] = reference
+    
+    # Call Paystack Initialize Transaction API (retried only when the
+    # request never reached Paystack)
+    response = await retry_policies["initialize"].run(
+        lambda: paystack_call(
+            "initialize",
+            lambda timeout: paystack.initialize_transaction(payload, timeout=timeout),
+            priority
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data["status"]:
-                # Store transaction reference
-                reference = data["data"]["reference"]
-                transactions[reference] = {
+    )
+    
+    if response.status_code != 200:
+        retry_after = response.headers.get("retry-after")
+        raise HTTPException(
+            status_code=response.status_code,
+            detail="Failed to initialize payment",
+            headers={"Retry-After": retry_after} if retry_after else None
+        )
+    
+    data = loads(response.content)
+    if not data["status"]:
+        raise HTTPException(status_code=400, detail=data.get("message", "Failed to initialize transaction"))
+    return data["data"]
+
+
+async def record_initialized(payments: List[dict]):
+    """Write pending local records for initialized payments in one batch"""
+    created_at = datetime.now().isoformat()
+    records = [
+        {
+            "reference": payment["reference"],
+            "email": payment["email"],
+            "amount": payment["amount"],
+            "name": payment.get("name") or "Guest",
+            "status": "pending",
+            "created_at": created_at
+        }
+        for payment in payments
+    ]
+    if OFFLOAD_STORE_WRITES:
+        await asyncio.to_thread(store.insert_many, records)
+    else:
+        store.insert_many(records)
+    mirror.upsert_many([
+        {
+            "reference": payment["reference"],
+            "amount": payment["amount"],
+            "email": payment["email"],
+            "status": "pending",
+            "currency": "NGN"
+        }
+        for payment in payments
+    ])
+
+
+async def create_transaction(email: str, amount: float, name: Optional[str]) -> dict:
+    """
+    Initialize a transaction with Paystack and record it locally. The
+    reference is minted here, so the pending record is written while the
+    upstream call is in flight and exists before any webhook for it.
+    """
+    # Fail fast before writing a record Paystack will never see
+    if breakers["initialize"].retry_after > 0:
+        raise CircuitOpenError("initialize", breakers["initialize"].retry_after)
+    
+    reference = new_reference()
+    upstream = asyncio.ensure_future(initialize_upstream(email, amount, name, reference=reference))
+    
+    # Store transaction reference
+    try:
+        await record_initialized([{"reference": reference, "email": email, "amount": amount, "name": name}])
+    except BaseException:
+        upstream.cancel()
+        raise
+    
+    try:
+        return await upstream
+    except Exception as e:
+        if never_initialized(e):
+            await forget_initialized([reference])
+        raise
+
+
+def never_initialized(error: Exception) -> bool:
+    """
+    Whether a failed initialize certainly left nothing at Paystack. A 4xx
+    (or a 200 with status false) or a local rejection means it never will;
+    after a timeout, transport error or 5xx the transaction may exist
+    upstream with only the response lost, so its record stays pending.
+    """
+    if isinstance(error, HTTPException):
+        return error.status_code < 500
+    return isinstance(error, UPSTREAM_UNAVAILABLE)
+
+
+async def forget_initialized(references: List[str]):
+    """Remove the records of payments Paystack never created"""
+    if OFFLOAD_STORE_WRITES:
+        await asyncio.to_thread(store.delete_many, references)
+    else:
+        store.delete_many(references)
+    for reference in references:
+        mirror.remove(reference)
+
+
+async def initialize_idempotent(key: str, email: str, amount: float, name: Optional[str]):
+    """
+    Initialize once per Idempotency-Key. Retries get the first successful
+    response back, and duplicates arriving while it is in flight wait on it.
+    Failures are not cached, so a retry after one tries again.
+    """
+    if not key or len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 1-255 characters")
+    
+    fingerprint = (email, amount, name)
+    leader = []
+    
+    async def first_call():
+        leader.append(True)
+        data = await create_transaction(email, amount, name)
+        idempotency_cache.set(key, (fingerprint, data))
+        return fingerprint, data
+    
+    entry = idempotency_cache.get(key)
+    if entry is None:
+        try:
+            entry = await initialize_flight.do(key, first_call)
+        except HTTPException:
+            raise
+        except UPSTREAM_UNAVAILABLE as e:
+            raise unavailable(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    replayed = not leader
+    
+    if entry[0] != fingerprint:
+        idempotency_stats["conflicts"] += 1
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    if replayed:
+        idempotency_stats["replayed"] += 1
+    
+    return FastJSONResponse(
+        content={
+            "status": True,
+            "message": "Transaction initialized successfully",
+            "data": entry[1]
+        },
+        headers={"Idempotent-Replayed": "true"} if replayed else None
+    )
+
+
+class BulkPayment(BaseModel):
+    """One payment in a bulk initialization"""
+    email: str
+    amount: float
+    name: Optional[str] = None
+    metadata: Optional[dict] = None
+
+
+def parse_bulk_payments(content_type: str, body: bytes) -> List[dict]:
+    """Raw payment items from a JSON body (a list or {"payments": [...]}) or a CSV body"""
+    if "csv" in content_type:
+        rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+        for row in rows:
+            if row.get("metadata"):
+                try:
+                    row["metadata"] = loads(row["metadata"])
+                except ValueError:
+                    pass  # reported as an invalid item
+            else:
+                row.pop("metadata", None)
+            if not row.get("name"):
+                row.pop("name", None)
+        return rows
+    
+    try:
+        parsed = loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON or CSV")
+    items = parsed.get("payments") if isinstance(parsed, dict) else parsed
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a list of payments")
+    return items
+
+
+async def initialize_many(items: List[dict], concurrency: int):
+    """
+    Initialize payments concurrently, yielding one NDJSON line per item as it
+    completes. Calls run in the background priority class, so a 429 pauses
+    them behind checkout traffic before they are retried. Pending records
+    are written BULK_RECORD_BATCH at a time before their upstream calls
+    start, so webhooks find them and a timed-out or cancelled call leaves a
+    record for the reconciler; the records of calls Paystack rejected are
+    removed again.
+    """
+    bulk_initialize_stats["batches"] += 1
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def initialize_one(index: int, payment: BulkPayment, reference: str) -> dict:
+        async with semaphore:
+            try:
+                data = await initialize_upstream(
+                    payment.email, payment.amount, payment.name, payment.metadata,
+                    reference=reference, priority=BACKGROUND
+                )
+                return {"index": index, "reference": reference, "data": data}
+            except Exception as e:
+                return {
+                    "index": index,
                     "reference": reference,
-                    "email": email,
-                    "amount": amount,
-                    "name": name or "Guest",
-                    "status": "pending",
-                    "created_at": datetime.now().isoformat()
+                    "error": e.detail if isinstance(e, HTTPException) else str(e),
+                    "forget": never_initialized(e)
                 }
-                
-                return JSONResponse(content={
-                    "status": True,
-                    "message": "Transaction initialized successfully",
-                    "data": data["data"]
-                })
-            else:
-                raise HTTPException(status_code=400, detail=data.get("message", "Failed to initialize transaction"))
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to initialize payment")
+    
+    tasks = set()
+    try:
+        for start in range(0, len(items), BULK_RECORD_BATCH):
+            lines, payments = [], []
+            for index, raw in enumerate(items[start:start + BULK_RECORD_BATCH], start):
+                error = None
+                if not isinstance(raw, dict):
+                    error = "payment must be an object"
+                elif not all(isinstance(key, str) for key in raw):
+                    # csv.DictReader files surplus fields under a None key
+                    error = "row has more fields than the header"
+                else:
+                    try:
+                        payment = BulkPayment(**raw)
+                    except ValidationError as e:
+                        error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                    except TypeError as e:
+                        error = str(e)
+                    else:
+                        if payment.amount <= 0:
+                            error = "amount: must be positive"
+                if error is not None:
+                    bulk_initialize_stats["failed"] += 1
+                    lines.append({"index": index, "status": False, "error": error})
+                    continue
+                payments.append((index, payment, new_reference()))
             
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+            if payments:
+                try:
+                    await record_initialized([
+                        {"reference": reference, "email": payment.email, "amount": payment.amount, "name": payment.name}
+                        for _, payment, reference in payments
+                    ])
+                except Exception as e:
+                    for index, _, _ in payments:
+                        bulk_initialize_stats["failed"] += 1
+                        lines.append({"index": index, "status": False, "error": f"Not recorded locally: {e}"})
+                else:
+                    tasks.update(asyncio.ensure_future(initialize_one(*payment)) for payment in payments)
+            if lines:
+                yield b"".join(dumps(line) + b"\n" for line in lines)
+        
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            results = [task.result() for task in done]
+            
+            rejected = [result["reference"] for result in results if result.get("forget")]
+            if rejected:
+                try:
+                    await forget_initialized(rejected)
+                except Exception as e:
+                    logger.warning("Removing %d rejected bulk payments failed: %s", len(rejected), e)
+            
+            lines = []
+            for result in results:
+                if "data" in result:
+                    bulk_initialize_stats["initialized"] += 1
+                    lines.append({
+                        "index": result["index"],
+                        "status": True,
+                        "reference": result["reference"],
+                        "authorization_url": result["data"].get("authorization_url"),
+                        "access_code": result["data"].get("access_code")
+                    })
+                else:
+                    bulk_initialize_stats["failed"] += 1
+                    line = {"index": result["index"], "status": False, "error": result["error"]}
+                    if not result["forget"]:
+                        # May still exist at Paystack; the reconciler settles it
+                        line["reference"] = result["reference"]
+                    lines.append(line)
+            yield b"".join(dumps(line) + b"\n" for line in lines)
+    finally:
+        # Stop outstanding work if the client disconnects mid-stream
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/api/initialize-payments")
+async def initialize_payments(request: Request):
+    """
+    Bulk Initialize Transactions
+    Takes a JSON or CSV list of {email, amount, name, metadata}, initializes
+    them concurrently and streams references and authorization URLs as NDJSON
+    """
+    items = parse_bulk_payments(request.headers.get("content-type", ""), await request.body())
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="No payments provided")
+    if len(items) > BULK_INITIALIZE_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BULK_INITIALIZE_MAX_ITEMS} payments per batch"
+        )
+    
+    return StreamingResponse(
+        initialize_many(items, BULK_INITIALIZE_CONCURRENCY),
+        media_type="application/x-ndjson"
+    )
+
+
+async def verify_upstream(reference: str, priority: str = VERIFY) -> dict:
+    """Paystack's transaction data for a reference"""
+    # Call Paystack Verify Transaction API, hedged and retried
+    def call():
+        return paystack_call(
+            "verify",
+            lambda timeout: paystack.verify_transaction(reference, timeout=timeout),
+            priority
+        )
+    
+    response = await retry_policies["verify"].run(lambda: verify_hedger.run(call, hedge_delay()))
+    
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to verify payment")
+    
+    data = loads(response.content)
+    if not data["status"]:
+        raise HTTPException(status_code=400, detail="Verification failed")
+    
+    return data["data"]
+
+
+def verified_fields(transaction_data: dict) -> dict:
+    """Local record fields set by a verification"""
+    return {
+        "status": transaction_data["status"],
+        "verified_at": datetime.now().isoformat(),
+        "gateway_response": transaction_data.get("gateway_response"),
+        "paid_at": transaction_data.get("paid_at"),
+        "channel": transaction_data.get("channel")
+    }
+
+
+def publish_verification(reference: str, transaction_data: dict) -> dict:
+    """Push a verified state to the mirror, SSE subscribers and the verify cache"""
+    mirror.upsert(format_transaction(transaction_data))
+    status_broker.publish(
+        reference,
+        transaction_data["status"],
+        "verify",
+        amount=transaction_data["amount"] / 100,
+        channel=transaction_data.get("channel")
+    )
+    
+    result = {
+        "reference": reference,
+        "amount": transaction_data["amount"] / 100,  # Convert from kobo
+        "status": transaction_data["status"],
+        "paid_at": transaction_data.get("paid_at"),
+        "channel": transaction_data.get("channel"),
+        "currency": transaction_data.get("currency"),
+        "customer": transaction_data.get("customer", {}).get("email"),
+        "source": "paystack",
+        "checked_at": from_epoch_ms(int(time.time() * 1000))
+    }
+    verify_cache.store(reference, result)
+    return result
+
+
+async def update_stored(reference: str, **fields) -> bool:
+    """Update a local record, off the event loop when the store is SQLite"""
+    if OFFLOAD_STORE_WRITES:
+        return await asyncio.to_thread(store.update, reference, **fields)
+    return store.update(reference, **fields)
+
+
+async def fetch_verification(reference: str, priority: str = VERIFY) -> dict:
+    """
+    Verify a reference against Paystack and apply the result locally.
+    Updates the local transaction record and the verify cache.
+    """
+    transaction_data = await verify_upstream(reference, priority)
+    
+    # Update local transaction record
+    await update_stored(reference, **verified_fields(transaction_data))
+    return publish_verification(reference, transaction_data)
+
+
+async def apply_reconciled(resolved: List[tuple]):
+    """Write reconciled (reference, transaction data) pairs back in one batch"""
+    updates = [(reference, verified_fields(data)) for reference, data in resolved]
+    if OFFLOAD_STORE_WRITES:
+        await asyncio.to_thread(store.update_many, updates)
+    else:
+        store.update_many(updates)
+    for reference, data in resolved:
+        publish_verification(reference, data)
+
+
+# Workers sharing a SQLite store take turns through a lease row so only one
+# of them reconciles; it lapses after three missed runs if that worker dies
+RECONCILE_LEASE = "pending_reconciler"
+RECONCILE_LEASE_OWNER = f"{os.getpid()}-{uuid.uuid4().hex}"
+RECONCILE_LEASE_TTL = max(3 * RECONCILE_INTERVAL, 60.0)
+
+# Background re-verification of records stuck in pending, at background priority
+reconciler = PendingReconciler(
+    store,
+    lambda reference: verify_upstream(reference, BACKGROUND),
+    apply_reconciled,
+    interval=RECONCILE_INTERVAL,
+    stale_after=RECONCILE_STALE_AFTER,
+    max_age=RECONCILE_MAX_AGE,
+    batch_size=RECONCILE_BATCH_SIZE,
+    concurrency=RECONCILE_CONCURRENCY,
+    base_backoff=RECONCILE_BASE_BACKOFF,
+    max_backoff=RECONCILE_MAX_BACKOFF,
+    offload=OFFLOAD_STORE_WRITES,
+    lease=(
+        (lambda: backend_store.acquire_lease(RECONCILE_LEASE, RECONCILE_LEASE_OWNER, RECONCILE_LEASE_TTL))
+        if isinstance(backend_store, SQLiteTransactionStore) else None
+    )
+)
+
+
+def webhook_verification(reference: str) -> Optional[dict]:
+    """
+    Verify result built from a signed charge.success already applied to the
+    local record, or None if no such confirmation exists
+    """
+    record = store.get(reference)
+    if record is None or record.get("status") != "success" or not record.get("webhook_received_at"):
+        return None
+    
+    # The latest of the webhook and any upstream verification since
+    checked_at = max(
+        to_epoch_ms(record["webhook_received_at"]),
+        to_epoch_ms(record.get("verified_at")) or 0
+    )
+    mirrored = mirror.get(reference) or {}
+    return {
+        "reference": reference,
+        "amount": record.get("amount_paid") or record.get("amount"),
+        "status": "success",
+        "paid_at": record.get("paid_at"),
+        "channel": record.get("channel"),
+        "currency": mirrored.get("currency"),
+        "customer": record.get("email"),
+        "source": "webhook",
+        "checked_at": from_epoch_ms(checked_at)
+    }
+
+
+def recheck_upstream(reference: str):
+    """Re-verify a webhook-confirmed reference against Paystack in the background"""
+    verify_rechecks["started"] += 1
+    task = asyncio.ensure_future(verify_flight.do(reference, lambda: fetch_verification(reference, BACKGROUND)))
+    _recheck_tasks.add(task)
+    
+    def done(task: asyncio.Future):
+        _recheck_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            verify_rechecks["failed"] += 1
+            logger.warning("Upstream re-check of %s failed: %s", reference, task.exception())
+    
+    task.add_done_callback(done)
+
+
+async def get_verification(reference: str, priority: str = VERIFY) -> dict:
+    """Cached, single-flight verification of one reference"""
+    cached = verify_cache.get(reference)
+    if cached is not None:
+        verify_sources["cache"] += 1
+        return cached
+    
+    # A signed charge.success is as authoritative as an upstream verify
+    if VERIFY_WEBHOOK_FIRST:
+        confirmed = webhook_verification(reference)
+        if confirmed is not None:
+            verify_sources["webhook"] += 1
+            age = time.time() - to_epoch_ms(confirmed["checked_at"]) / 1000
+            if VERIFY_WEBHOOK_RECHECK_AFTER > 0 and age > VERIFY_WEBHOOK_RECHECK_AFTER:
+                recheck_upstream(reference)
+            return confirmed
+    
+    # Concurrent verifications of one reference share a single upstream call
+    try:
+        result = await verify_flight.do(reference, lambda: fetch_verification(reference, priority))
+    except UPSTREAM_UNAVAILABLE:
+        # Paystack is unavailable: answer from the local record, labeled as such
+        local = local_verification(reference)
+        if local is None:
+            raise
+        verify_sources["local"] += 1
+        return local
+    verify_sources["paystack"] += 1
+    return result
+
+
+def local_verification(reference: str) -> Optional[dict]:
+    """Last known state of a reference from the local record"""
+    record = store.get(reference)
+    if record is None:
+        return None
+    
+    checked_at = max(
+        to_epoch_ms(record.get(field)) or 0
+        for field in ("created_at", "verified_at", "webhook_received_at")
+    )
+    return {
+        "reference": reference,
+        "amount": record.get("amount_paid") or record.get("amount"),
+        "status": record.get("status"),
+        "paid_at": record.get("paid_at"),
+        "channel": record.get("channel"),
+        "currency": (mirror.get(reference) or {}).get("currency"),
+        "customer": record.get("email"),
+        "source": "local",
+        "checked_at": from_epoch_ms(checked_at)
+    }
+
+
+def freshness(result: dict) -> float:
+    """Seconds since the result was last confirmed by Paystack or a webhook"""
+    return round(time.time() - to_epoch_ms(result["checked_at"]) / 1000, 3)
 
 
 @app.get("/api/verify-payment/{reference}")
@@ -131,48 +1048,122 @@ async def verify_payment(reference: str):
     Confirms if a transaction was successful
     """
     try:
-        # Call Paystack Verify Transaction API
-        response = requests.get(
-            f"{PAYSTACK_BASE_URL}/transaction/verify/{reference}",
-            headers=get_paystack_headers()
-        )
+        result = await get_verification(reference)
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            if data["status"]:
-                transaction_data = data["data"]
-                
-                # Update local transaction record
-                if reference in transactions:
-                    transactions[reference]["status"] = transaction_data["status"]
-                    transactions[reference]["verified_at"] = datetime.now().isoformat()
-                    transactions[reference]["gateway_response"] = transaction_data.get("gateway_response")
-                    transactions[reference]["paid_at"] = transaction_data.get("paid_at")
-                    transactions[reference]["channel"] = transaction_data.get("channel")
-                
-                return JSONResponse(content={
-                    "status": True,
-                    "message": "Verification successful",
-                    "data": {
-                        "reference": reference,
-                        "amount": transaction_data["amount"] / 100,  # Convert from kobo
-                        "status": transaction_data["status"],
-                        "paid_at": transaction_data.get("paid_at"),
-                        "channel": transaction_data.get("channel"),
-                        "currency": transaction_data.get("currency"),
-                        "customer": transaction_data.get("customer", {}).get("email")
-                    }
-                })
-            else:
-                raise HTTPException(status_code=400, detail="Verification failed")
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to verify payment")
+        return FastJSONResponse(content={
+            "status": True,
+            "message": "Verification successful",
+            "data": result,
+            "source": result["source"],
+            "age_seconds": freshness(result)
+        })
             
+    except HTTPException:
+        raise
+    except UPSTREAM_UNAVAILABLE as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class BatchVerifyRequest(BaseModel):
+    """Body for the batch verification endpoint"""
+    references: List[str]
+
+
+async def verify_many(references: List[str], concurrency: int):
+    """Verify references concurrently, yielding one NDJSON line per result as it completes"""
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def verify_one(reference: str) -> dict:
+        async with semaphore:
+            try:
+                data = await get_verification(reference, BACKGROUND)
+                return {"reference": reference, "status": True, "data": data}
+            except HTTPException as e:
+                return {"reference": reference, "status": False, "error": e.detail}
+            except Exception as e:
+                return {"reference": reference, "status": False, "error": str(e)}
+    
+    tasks = [asyncio.ensure_future(verify_one(reference)) for reference in references]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield dumps(await next_done) + b"\n"
+    finally:
+        # Stop outstanding work if the client disconnects mid-stream
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/api/verify-payments")
+async def verify_payments(batch: BatchVerifyRequest):
+    """
+    Batch Verify Transactions
+    Verifies many references concurrently and streams results as NDJSON
+    """
+    references = list(dict.fromkeys(ref.strip() for ref in batch.references if ref.strip()))
+    
+    if not references:
+        raise HTTPException(status_code=400, detail="No references provided")
+    if len(references) > BATCH_VERIFY_MAX_REFERENCES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_VERIFY_MAX_REFERENCES} references per batch"
+        )
+    
+    return StreamingResponse(
+        verify_many(references, BATCH_VERIFY_CONCURRENCY),
+        media_type="application/x-ndjson"
+    )
+
+
+def format_transaction(txn: dict) -> dict:
+    """Shape a Paystack transaction for our API and templates"""
+    return {
+        "reference": txn.get("reference"),
+        "amount": txn.get("amount", 0) / 100,
+        "email": txn.get("customer", {}).get("email"),
+        "status": txn.get("status"),
+        "paid_at": txn.get("paid_at"),
+        "channel": txn.get("channel"),
+        "currency": txn.get("currency"),
+        "created_at": txn.get("createdAt") or txn.get("created_at")
+    }
+
+
+async def fetch_transactions_page(params: dict) -> dict:
+    """Fetch and format one page of transactions from Paystack"""
+    response = await retry_policies["list"].run(
+        lambda: paystack_call(
+            "list",
+            lambda timeout: paystack.list_transactions(params, timeout=timeout)
+        )
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch transactions")
+    
+    data = loads(response.content)
+    if not data["status"]:
+        raise HTTPException(status_code=400, detail="Failed to fetch transactions")
+    
+    return {
+        "data": [format_transaction(txn) for txn in data["data"]],
+        "meta": data.get("meta", {})
+    }
+
+
+# Background engine that pulls new and changed transactions into the mirror
+sync_engine = SyncEngine(
+    mirror,
+    fetch_transactions_page,
+    interval=MIRROR_SYNC_INTERVAL,
+    page_size=MIRROR_SYNC_PAGE_SIZE,
+    overlap=MIRROR_SYNC_OVERLAP,
+    window=EXPORT_PREFETCH_PAGES
+)
+
+
 @app.get("/api/list-transactions")
 async def list_transactions(page: int = 1, perPage: int = 10):
     """
@@ -180,107 +1171,386 @@ async def list_transactions(page: int = 1, perPage: int = 10):
     Fetches list of transactions from Paystack
     """
     try:
+        # Serve from the local mirror once it has completed a sync
+        if mirror.ready:
+            result = mirror.page(page, perPage)
+            return FastJSONResponse(content={
+                "status": True,
+                "message": "Transactions retrieved successfully",
+                "data": result["data"],
+                "meta": result["meta"]
+            })
+        
         params = {
             "page": page,
             "perPage": perPage
         }
         
-        response = requests.get(
-            f"{PAYSTACK_BASE_URL}/transaction",
-            headers=get_paystack_headers(),
-            params=params
-        )
+        # Identical page requests in flight share one upstream call
+        key = tuple(sorted(params.items()))
+        try:
+            result = await list_flight.do(key, lambda: fetch_transactions_page(params))
+        except UPSTREAM_UNAVAILABLE:
+            # Paystack is unavailable: whatever the mirror holds beats an error
+            if not len(mirror):
+                raise
+            result = mirror.page(page, perPage)
+        else:
+            mirror.upsert_many(result["data"])
         
-        if response.status_code == 200:
-            data = response.json()
+        return FastJSONResponse(content={
+            "status": True,
+            "message": "Transactions retrieved successfully",
+            "data": result["data"],
+            "meta": result["meta"]
+        })
             
-            if data["status"]:
-                # Format transactions
-                formatted_transactions = []
-                for txn in data["data"]:
-                    formatted_transactions.append({
-                        "reference": txn.get("reference"),
-                        "amount": txn.get("amount", 0) / 100,
-                        "email": txn.get("customer", {}).get("email"),
-                        "status": txn.get("status"),
-                        "paid_at": txn.get("paid_at"),
-                        "channel": txn.get("channel"),
-                        "currency": txn.get("currency")
-                    })
-                
-                return JSONResponse(content={
-                    "status": True,
-                    "message": "Transactions retrieved successfully",
-                    "data": formatted_transactions,
-                    "meta": data.get("meta", {})
-                })
+    except HTTPException:
+        raise
+    except UPSTREAM_UNAVAILABLE as e:
+        raise unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def stream_export(export_id: int, params: dict, fmt: str):
+    """Stream every matching transaction page by page, keeping memory flat"""
+    try:
+        async for page in iter_pages(fetch_transactions_page, params, window=EXPORT_PREFETCH_PAGES):
+            first = export_progress.active[export_id]["pages_done"] == 0
+            export_progress.page_done(export_id, page)
+            if fmt == "csv":
+                yield to_csv(page["data"], header=first)
             else:
-                raise HTTPException(status_code=400, detail="Failed to fetch transactions")
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch transactions")
-            
+                yield to_ndjson(page["data"])
+    finally:
+        export_progress.finish(export_id)
+
+
+@app.get("/api/export-transactions")
+async def export_transactions(
+    format: str = "ndjson",
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+    status: Optional[str] = None
+):
+    """
+    Export Transactions
+    Streams the full Paystack transaction history as NDJSON or CSV
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    
+    params = {"perPage": EXPORT_PAGE_SIZE}
+    filters = {"from": from_date, "to": to_date, "status": status}
+    params.update({key: value for key, value in filters.items() if value})
+    
+    export_id = export_progress.start(filters)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    
+    return StreamingResponse(
+        stream_export(export_id, params, format),
+        media_type=media_type,
+        headers={
+            "X-Export-Id": str(export_id),
+            "Content-Disposition": f"attachment; filename=transactions.{format}"
+        }
+    )
+
+
+# Reconciliation reports started by this worker, by report id
+reconciliation_jobs: Dict[str, ReconciliationJob] = {}
+
+
+def parse_report_bound(value: str, end: bool = False) -> int:
+    """Date or ISO timestamp to epoch ms; a bare end date covers that whole day"""
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if end and len(value) == 10:
+        moment += timedelta(days=1) - timedelta(milliseconds=1)
+    return int(moment.timestamp() * 1000)
+
+
+@app.post("/api/reconciliation-reports")
+async def start_reconciliation_report(
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to")
+):
+    """
+    Reconciliation Report
+    Starts a diff of local records against Paystack for a date range, or
+    resumes it from its last checkpoint if the same range was started before
+    """
+    try:
+        start_ms = parse_report_bound(from_date)
+        end_ms = parse_report_bound(to_date, end=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from and to must be ISO dates or timestamps")
+    if start_ms > end_ms:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    
+    try:
+        job = reconciliation_jobs.get(report_id(start_ms, end_ms))
+        if job is None or not job.running:
+            job = ReconciliationJob(
+                store,
+                fetch_transactions_page,
+                RECONCILE_REPORT_DIR,
+                start_ms,
+                end_ms,
+                window=RECONCILE_REPORT_WINDOW,
+                slack=RECONCILE_REPORT_SLACK,
+                page_size=EXPORT_PAGE_SIZE,
+                prefetch=EXPORT_PREFETCH_PAGES,
+                batch_size=RECONCILE_REPORT_BATCH_SIZE,
+                offload=OFFLOAD_STORE_WRITES
+            )
+            if job.state["status"] != "done" and not job.start():
+                # Another worker process holds the report's lock
+                return {
+                    "status": True,
+                    "message": "Reconciliation report is already running",
+                    "data": {**job.stats(), "status": RUNNING}
+                }
+            reconciliation_jobs[job.id] = job
+        
+        return {
+            "status": True,
+            "message": "Reconciliation report started",
+            "data": job.stats()
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/reconciliation-reports/{report}")
+async def reconciliation_report_status(report: str):
+    """Progress and counts of a reconciliation report"""
+    job = reconciliation_jobs.get(report)
+    if job is not None:
+        stats = job.stats()
+    else:
+        state = load_state(RECONCILE_REPORT_DIR, report)
+        if state is None:
+            raise HTTPException(status_code=404, detail="Reconciliation report not found")
+        stats = describe(state)
+        if stats["status"] != "done" and report_running(RECONCILE_REPORT_DIR, report):
+            stats["status"] = RUNNING
+    
+    return {
+        "status": True,
+        "message": "Reconciliation report retrieved successfully",
+        "data": stats
+    }
+
+
+@app.get("/api/reconciliation-reports/{report}/report")
+async def reconciliation_report_file(report: str):
+    """
+    Download the NDJSON report (complete once the status is done): one
+    missing, extra or mismatch entry per line, then a summary line
+    """
+    directory = report_dir(RECONCILE_REPORT_DIR, report)
+    path = os.path.join(directory, "report.ndjson") if directory else None
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Reconciliation report not found")
+    
+    return FileResponse(path, media_type="application/x-ndjson", filename=f"reconciliation-{report}.ndjson")
+
+
+# Webhook event handlers; all handlers for one event run concurrently,
+# each under its own timeout
+webhook_router = EventRouter(default_timeout=WEBHOOK_HANDLER_TIMEOUT)
+
+
+def refund_reference(event: dict) -> Optional[str]:
+    data = event.get("data", {})
+    return data.get("transaction_reference") or data.get("reference")
+
+
+@webhook_router.register("charge.success", name="store")
+async def record_charge_success(event: dict, received_at: float):
+    """Payment was successful"""
+    data = event.get("data", {})
+    await update_stored(
+        data.get("reference"),
+        status="success",
+        webhook_received_at=datetime.fromtimestamp(received_at).isoformat(),
+        amount_paid=data.get("amount", 0) / 100,
+        paid_at=data.get("paid_at"),
+        channel=data.get("channel")
+    )
+
+
+@webhook_router.register("charge.success", name="mirror")
+async def mirror_charge_success(event: dict, received_at: float):
+    mirror.upsert(format_transaction(event.get("data", {})))
+
+
+@webhook_router.register("charge.success", "refund.processed", name="cache")
+async def invalidate_verification(event: dict, received_at: float):
+    """Drop any cached verify result so the next call sees the new state"""
+    if event.get("event") == "refund.processed":
+        verify_cache.invalidate(refund_reference(event))
+    else:
+        verify_cache.invalidate(event.get("data", {}).get("reference"))
+
+
+@webhook_router.register("charge.success", "refund.processed", name="notify")
+async def notify_subscribers(event: dict, received_at: float):
+    """Push the new status to SSE subscribers"""
+    data = event.get("data", {})
+    if event.get("event") == "refund.processed":
+        status_broker.publish(refund_reference(event), "reversed", "webhook")
+    else:
+        status_broker.publish(
+            data.get("reference"),
+            "success",
+            "webhook",
+            amount=data.get("amount", 0) / 100,
+            channel=data.get("channel")
+        )
+
+
+@webhook_router.register("refund.processed", name="store")
+async def record_refund(event: dict, received_at: float):
+    """A processed refund reverses the original transaction"""
+    reference = refund_reference(event)
+    await update_stored(reference, status="reversed")
+    mirror.upsert({"reference": reference, "status": "reversed"})
+
+
+@webhook_router.register(
+    "refund.pending", "refund.failed",
+    "transfer.success", "transfer.failed", "transfer.reversed",
+    "charge.dispute.create", "charge.dispute.remind", "charge.dispute.resolve",
+    "subscription.create", "subscription.disable", "subscription.not_renew",
+    "invoice.create", "invoice.update", "invoice.payment_failed",
+    name="log"
+)
+async def log_event(event: dict, received_at: float):
+    """Events we do not act on yet are recorded instead of dropped"""
+    data = event.get("data", {})
+    logger.info(
+        "Paystack event %s for %s",
+        event.get("event"),
+        data.get("reference") or data.get("transfer_code") or data.get("subscription_code") or data.get("id")
+    )
+
+
+# Webhook signing key, encoded once
+WEBHOOK_SECRET = (PAYSTACK_SECRET_KEY or "").encode("utf-8")
+
+# Durable queue between webhook acknowledgment and processing
+webhook_processor = WebhookProcessor(
+    WebhookQueue(WEBHOOK_QUEUE_PATH, lease_seconds=WEBHOOK_LEASE_SECONDS),
+    webhook_router.dispatch,
+    workers=WEBHOOK_WORKERS,
+    max_attempts=WEBHOOK_MAX_ATTEMPTS,
+    deduplicator=EventDeduplicator(window=WEBHOOK_DEDUPE_WINDOW, max_size=WEBHOOK_DEDUPE_MAX_KEYS)
+)
+
+
 @app.post("/webhook/paystack")
 async def paystack_webhook(request: Request):
     """
     Webhook endpoint to receive payment notifications from Paystack
-    This demonstrates real-time payment status updates
+    Verifies the signature, queues the event durably and acknowledges at once
     """
     try:
+        # Anyone can sign with an empty key
+        if not WEBHOOK_SECRET:
+            raise HTTPException(status_code=503, detail="Webhook signing key is not configured")
+        
         # Get the signature from headers
         signature = request.headers.get("x-paystack-signature")
         
         # Get the raw body
         body = await request.body()
         
-        # Verify webhook signature
-        if signature:
-            hash_value = hmac.new(
-                PAYSTACK_SECRET_KEY.encode('utf-8'),
-                body,
-                hashlib.sha512
-            ).hexdigest()
-            
-            if hash_value != signature:
-                raise HTTPException(status_code=400, detail="Invalid signature")
-        
-        # Parse the webhook data
-        event = await request.json()
+        # Verify webhook signature; applied events are trusted as verification
+        # results, so unsigned bodies are rejected
+        hash_value = hmac.new(
+            WEBHOOK_SECRET,
+            body,
+            hashlib.sha512
+        ).hexdigest()
         
-        # Handle different event types
-        event_type = event.get("event")
+        if not signature or not hmac.compare_digest(hash_value, signature):
+            raise HTTPException(status_code=400, detail="Invalid signature")
         
-        if event_type == "charge.success":
-            # Payment was successful
-            data = event.get("data", {})
-            reference = data.get("reference")
-            
-            if reference in transactions:
-                transactions[reference]["status"] = "success"
-                transactions[reference]["webhook_received_at"] = datetime.now().isoformat()
-                transactions[reference]["amount_paid"] = data.get("amount", 0) / 100
+        # Queue the bytes as received; the consumer parses them exactly once
+        webhook_processor.enqueue(body)
         
-        return JSONResponse(content={"status": "success"})
+        return FastJSONResponse(content={"status": "success"})
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def event_stream(reference: Optional[str]) -> StreamingResponse:
+    if status_broker.full:
+        raise HTTPException(status_code=503, detail="Too many subscribers")
+    
+    return StreamingResponse(
+        status_broker.stream(reference),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/events")
+async def all_status_events():
+    """Server-Sent Events stream of status changes for all transactions"""
+    return event_stream(None)
+
+
+@app.get("/api/events/{reference}")
+async def status_events(reference: str):
+    """Server-Sent Events stream of status changes for one reference"""
+    return event_stream(reference)
+
+
 @app.get("/payment-callback", response_class=HTMLResponse)
 async def payment_callback(request: Request, reference: str = None):
     """Payment callback page after Paystack redirect"""
+    verification = None
+    if reference and CALLBACK_VERIFY_DEADLINE > 0:
+        verification = await verify_within_deadline(reference, CALLBACK_VERIFY_DEADLINE)
+    
     return templates.TemplateResponse(
         "callback.html",
         {
             "request": request,
-            "reference": reference
+            "reference": reference,
+            "verification": verification
         }
     )
 
 
+async def verify_within_deadline(reference: str, deadline: float) -> Optional[dict]:
+    """
+    Verification result if it is ready within the deadline, else None.
+    A slow upstream call keeps running (shielded and single-flighted), so the
+    browser's own verify request picks up its result.
+    """
+    task = asyncio.ensure_future(get_verification(reference))
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), timeout=deadline)
+    except asyncio.TimeoutError:
+        callback_verifications["deadline_missed"] += 1
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return None
+    except Exception as e:
+        callback_verifications["failed"] += 1
+        logger.warning("Callback verification of %s failed: %s", reference, e)
+        return None
+    
+    callback_verifications["embedded"] += 1
+    return result
+
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
@@ -291,6 +1561,42 @@ async def health_check():
     }
 
 
+@app.get("/api/metrics")
+async def metrics():
+    """Runtime metrics for caches and background work"""
+    return {
+        "verify_cache": verify_cache.stats(),
+        "verify_single_flight": verify_flight.stats(),
+        "verify_sources": dict(verify_sources),
+        "verify_webhook_rechecks": dict(verify_rechecks, in_flight=len(_recheck_tasks)),
+        "callback_verifications": callback_verifications,
+        "bulk_initialize": bulk_initialize_stats,
+        "circuit_breakers": {endpoint: breaker.stats() for endpoint, breaker in breakers.items()},
+        "outbound_scheduler": scheduler.stats(),
+        "retries": {endpoint: policy.stats() for endpoint, policy in retry_policies.items()},
+        "verify_hedging": verify_hedger.stats(),
+        "idempotency": dict(
+            idempotency_stats,
+            cache=idempotency_cache.stats(),
+            single_flight=initialize_flight.stats()
+        ),
+        "list_single_flight": list_flight.stats(),
+        "exports": export_progress.stats(),
+        "mirror": sync_engine.stats(),
+        "pending_reconciler": reconciler.stats(),
+        "reconciliation_reports": {job_id: job.stats() for job_id, job in reconciliation_jobs.items()},
+        "webhooks": webhook_processor.stats(),
+        "webhook_handlers": webhook_router.stats(),
+        "status_events": status_broker.stats(),
+        "json_backend": JSON_BACKEND,
+        "storage": store.stats() if isinstance(store, TieredTransactionStore) else {"size": store.count()},
+        "shared_state": {
+            "local_cache": store.cache.stats(),
+            "change_feed": change_feed.stats()
+        } if change_feed is not None else None
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,145 @@
+"""
+Compact transaction record
+A __slots__ record with integer kobo amounts, epoch-millisecond timestamps
+and shared (interned) status/channel values. Dicts in the existing JSON
+and template shapes are only built at the edge.
+"""
+import sys
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Optional, Union
+
+
+# Paystack transaction states that never change once reached
+TERMINAL_STATUSES = frozenset({"success", "failed", "abandoned", "reversed"})
+
+
+class TransactionStatus(str, Enum):
+    PENDING = "pending"
+    ONGOING = "ongoing"
+    SUCCESS = "success"
+    FAILED = "failed"
+    ABANDONED = "abandoned"
+    REVERSED = "reversed"
+    QUEUED = "queued"
+    PROCESSING = "processing"
+
+
+class Channel(str, Enum):
+    CARD = "card"
+    BANK = "bank"
+    BANK_TRANSFER = "bank_transfer"
+    USSD = "ussd"
+    QR = "qr"
+    MOBILE_MONEY = "mobile_money"
+    EFT = "eft"
+    APPLE_PAY = "apple_pay"
+
+
+_STATUSES = {member.value: member for member in TransactionStatus}
+_CHANNELS = {member.value: member for member in Channel}
+
+
+def _enum_or_intern(lookup: dict, value: Optional[str]) -> Optional[Union[Enum, str]]:
+    """Map to a shared enum member; unknown values are interned strings"""
+    if value is None:
+        return None
+    member = lookup.get(value)
+    return member if member is not None else sys.intern(str(value))
+
+
+def _enum_value(value) -> Optional[str]:
+    return value.value if isinstance(value, Enum) else value
+
+
+def to_kobo(amount: Optional[float]) -> Optional[int]:
+    return int(round(amount * 100)) if amount is not None else None
+
+
+def from_kobo(kobo: Optional[int]) -> Optional[float]:
+    return kobo / 100 if kobo is not None else None
+
+
+def to_epoch_ms(value: Optional[str]) -> Optional[int]:
+    """ISO 8601 string (naive values are local time) to epoch milliseconds"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return int(parsed.timestamp() * 1000)
+
+
+def from_epoch_ms(value: Optional[int]) -> Optional[str]:
+    """Epoch milliseconds to Paystack-style UTC ISO 8601 (2024-01-01T10:00:00.000Z)"""
+    if value is None:
+        return None
+    moment = datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value % 1000:03d}Z"
+
+
+# Field name -> (slot, decode from dict value, encode to dict value)
+_FIELDS = {
+    "reference": ("reference", None, None),
+    "email": ("email", None, None),
+    "amount": ("amount_kobo", to_kobo, from_kobo),
+    "name": ("name", sys.intern, None),
+    "status": ("status", lambda v: _enum_or_intern(_STATUSES, v), _enum_value),
+    "created_at": ("created_at", to_epoch_ms, from_epoch_ms),
+    "verified_at": ("verified_at", to_epoch_ms, from_epoch_ms),
+    "gateway_response": ("gateway_response", sys.intern, None),
+    "paid_at": ("paid_at", to_epoch_ms, from_epoch_ms),
+    "channel": ("channel", lambda v: _enum_or_intern(_CHANNELS, v), _enum_value),
+    "webhook_received_at": ("webhook_received_at", to_epoch_ms, from_epoch_ms),
+    "amount_paid": ("amount_paid_kobo", to_kobo, from_kobo),
+    "currency": ("currency", sys.intern, None),
+    "next_check_at": ("next_check_at", to_epoch_ms, from_epoch_ms),
+    "checks": ("checks", None, None),
+}
+
+# Keys of a formatted Paystack transaction (list/export responses)
+API_FIELDS = ("reference", "amount", "email", "status", "paid_at", "channel", "currency", "created_at")
+
+
+class Transaction:
+    """One transaction in as few bytes as practical"""
+
+    __slots__ = tuple(slot for slot, _, _ in _FIELDS.values())
+
+    def __init__(self, reference: str, **fields):
+        for slot in self.__slots__:
+            setattr(self, slot, None)
+        self.reference = reference
+        self.update(fields)
+
+    @classmethod
+    def from_dict(cls, record: dict) -> "Transaction":
+        record = dict(record)
+        return cls(record.pop("reference"), **record)
+
+    def update(self, fields: dict, skip_none: bool = True):
+        """Merge dict-shaped fields (naira amounts, ISO timestamps)"""
+        for key, value in fields.items():
+            if value is None and skip_none:
+                continue
+            slot, decode, _ = _FIELDS[key]
+            setattr(self, slot, decode(value) if decode and value is not None else value)
+
+    def get(self, key: str):
+        slot, _, encode = _FIELDS[key]
+        value = getattr(self, slot)
+        return encode(value) if encode and value is not None else value
+
+    def to_record(self) -> dict:
+        """Local store shape; unset fields are omitted"""
+        record = {}
+        for key in _FIELDS:
+            value = self.get(key)
+            if value is not None:
+                record[key] = value
+        return record
+
+    def to_api(self) -> dict:
+        """Formatted-transaction shape used by list/export responses"""
+        return {key: self.get(key) for key in API_FIELDS}
+
+    def __repr__(self):
+        return f"Transaction({self.reference!r}, status={_enum_value(self.status)!r})"
@@ -0,0 +1,77 @@
+"""
+Async Paystack API client
+One pooled, keep-alive HTTP client shared by every request handler
+"""
+from typing import Optional
+
+import httpx
+
+
+class PaystackClient:
+    """Thin async wrapper around the Paystack REST API"""
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: dict,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 50,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 15.0,
+        connect_timeout: float = 5.0
+    ):
+        self.base_url = base_url
+        self.headers = headers
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        """Open the shared connection pool (called once on app startup)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+
+    async def close(self):
+        """Close the connection pool (called once on app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("Paystack client is not started")
+        return self._client
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> httpx.Response:
+        """Send a request through the pool, optionally overriding the timeout"""
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=self.timeout.connect)
+        return await self.client.request(method, path, **kwargs)
+
+    async def initialize_transaction(self, payload: dict, timeout: Optional[float] = None) -> httpx.Response:
+        """POST /transaction/initialize"""
+        return await self.request("POST", "/transaction/initialize", json=payload, timeout=timeout)
+
+    async def verify_transaction(self, reference: str, timeout: Optional[float] = None) -> httpx.Response:
+        """GET /transaction/verify/:reference"""
+        return await self.request("GET", f"/transaction/verify/{reference}", timeout=timeout)
+
+    async def list_transactions(self, params: dict, timeout: Optional[float] = None) -> httpx.Response:
+        """GET /transaction"""
+        return await self.request("GET", "/transaction", params=params, timeout=timeout)
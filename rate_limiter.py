@@ -0,0 +1,168 @@
+"""
+Outbound Paystack rate limiting
+A token bucket sized to our quota, shared by every outbound call and
+handed out by priority class, with bounded wait queues and a global pause
+when Paystack answers 429
+"""
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+
+# Priority classes, most important first
+CHECKOUT = "checkout"
+VERIFY = "verify"
+BACKGROUND = "background"
+PRIORITIES = (CHECKOUT, VERIFY, BACKGROUND)
+
+
+class QueueFullError(Exception):
+    """Raised when a priority class already has its maximum number of waiters"""
+
+    def __init__(self, priority: str, retry_after: float):
+        super().__init__(f"Too many queued Paystack {priority} calls")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class OutboundScheduler:
+    """
+    Token bucket with strict priority between classes. A class only takes a
+    token while the bucket holds more than its reserve, so background work
+    leaves headroom for checkout and verify and is the first to slow down.
+    """
+
+    def __init__(
+        self,
+        rate: float = 50.0,
+        burst: int = 100,
+        max_waiting: int = 1000,
+        background_reserve: float = 0.2
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_waiting = max_waiting
+        self.reserves = {CHECKOUT: 0.0, VERIFY: 0.0, BACKGROUND: burst * background_reserve}
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.granted = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self.throttled = 0
+        self._waits: Dict[str, deque] = defaultdict(lambda: deque(maxlen=500))
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _can_take(self, priority: str) -> bool:
+        return self.tokens - 1 >= self.reserves[priority]
+
+    def _ahead(self, priority: str) -> bool:
+        """Whether anyone of this or a higher priority is already waiting"""
+        for other in PRIORITIES:
+            if self._waiters[other]:
+                return True
+            if other == priority:
+                return False
+        return False
+
+    async def acquire(self, priority: str = BACKGROUND):
+        """Wait for a token in the given priority class"""
+        now = time.monotonic()
+        self._refill(now)
+        if now >= self.paused_until and not self._ahead(priority) and self._can_take(priority):
+            self.tokens -= 1
+            self.granted[priority] += 1
+            self._waits[priority].append(0.0)
+            return
+
+        waiters = self._waiters[priority]
+        if len(waiters) >= self.max_waiting:
+            self.rejected[priority] += 1
+            raise QueueFullError(priority, max(self.paused_until - now, len(waiters) / self.rate))
+
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        self._ensure_dispatcher()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.tokens += 1  # granted just as the caller gave up
+            else:
+                try:
+                    waiters.remove(future)
+                except ValueError:
+                    pass
+            raise
+        self._waits[priority].append(time.monotonic() - now)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (Paystack said 429 / Retry-After)"""
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self._updated = time.monotonic()
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        self._wakeup.set()
+
+    def _grant_next(self) -> bool:
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            while waiters and waiters[0].done():
+                waiters.popleft()  # cancelled while queued
+            if waiters and self._can_take(priority):
+                self.tokens -= 1
+                self.granted[priority] += 1
+                waiters.popleft().set_result(None)
+                return True
+            if waiters:
+                return False  # strict priority: lower classes wait behind it
+        return False
+
+    async def _dispatch(self):
+        while any(self._waiters.values()):
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            while self._grant_next():
+                pass
+            if any(self._waiters.values()):
+                # Sleep until roughly one more token has accrued
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1 / self.rate)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._refill(now)
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[priority] = {
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3) if ordered else 0.0
+            }
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "paused_seconds": round(max(0.0, self.paused_until - now), 3),
+            "throttled": self.throttled,
+            "waiting": {priority: len(waiters) for priority, waiters in self._waiters.items()},
+            "granted": dict(self.granted),
+            "rejected": dict(self.rejected),
+            "wait": waits
+        }
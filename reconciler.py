@@ -0,0 +1,158 @@
+"""
+Stale pending reconciliation
+Periodically re-verifies local records that have stayed unresolved (pending,
+ongoing, ...) past a threshold (closed tab, lost webhook) and writes resolved
+states back in bulk
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models import TERMINAL_STATUSES, from_epoch_ms
+from storage import TransactionStore
+
+
+logger = logging.getLogger(__name__)
+
+
+class PendingReconciler:
+    """
+    Each run asks the store for unresolved records older than `stale_after`
+    (and younger than `max_age`) that are due, takes the `batch_size` most
+    important (newest hour first, highest amount first within it) and
+    verifies them `concurrency` at a time. References that are still
+    unresolved get a next_check_at an exponentially growing interval away,
+    stored on the record so every worker sees the same schedule. With a
+    `lease`, a run is skipped unless this process holds it.
+    """
+
+    def __init__(
+        self,
+        store: TransactionStore,
+        verify: Callable[[str], Awaitable[dict]],
+        apply: Callable[[List[Tuple[str, dict]]], Awaitable[None]],
+        interval: float = 60.0,
+        stale_after: float = 900.0,
+        max_age: float = 7 * 86400.0,
+        batch_size: int = 100,
+        concurrency: int = 5,
+        base_backoff: float = 300.0,
+        max_backoff: float = 6 * 3600.0,
+        offload: bool = False,
+        lease: Optional[Callable[[], bool]] = None
+    ):
+        self.store = store
+        self.verify = verify  # reference -> Paystack transaction data
+        self.apply = apply  # bulk write of [(reference, transaction data)]
+        self.interval = interval
+        self.stale_after = stale_after
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.offload = offload  # run store calls in a thread (SQLite)
+        self.lease = lease  # takes or renews the single-runner lease
+        self.leader = lease is None
+        self.runs = 0
+        self.checked = 0
+        self.resolved: Dict[str, int] = {}
+        self.unresolved = 0
+        self.errors = 0
+        self.last_run_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _call(self, fn, *args):
+        if self.offload:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _recheck_fields(self, record: dict, now: float) -> dict:
+        checks = record.get("checks") or 0
+        delay = min(self.max_backoff, self.base_backoff * 2 ** checks)
+        return {"next_check_at": from_epoch_ms(int((now + delay) * 1000)), "checks": checks + 1}
+
+    async def reconcile_once(self) -> int:
+        """Verify one batch of stale unresolved records, returning how many resolved"""
+        began = time.monotonic()
+        now = time.time()
+        candidates = await self._call(
+            self.store.due_for_check,
+            from_epoch_ms(int((now - self.max_age) * 1000)),
+            from_epoch_ms(int((now - self.stale_after) * 1000)),
+            from_epoch_ms(int(now * 1000)),
+            self.batch_size
+        )
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(reference: str) -> Optional[dict]:
+            async with semaphore:
+                try:
+                    return await self.verify(reference)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.errors += 1
+                    logger.info("Reconcile verify of %s failed: %s", reference, e)
+                    return None
+
+        results = await asyncio.gather(*(check(record["reference"]) for record in candidates))
+        self.checked += len(candidates)
+
+        resolved, rechecks = [], []
+        for record, data in zip(candidates, results):
+            status = data.get("status") if data else None
+            if status in TERMINAL_STATUSES:
+                resolved.append((record["reference"], data))
+                self.resolved[status] = self.resolved.get(status, 0) + 1
+            else:
+                self.unresolved += 1
+                rechecks.append((record["reference"], self._recheck_fields(record, now)))
+
+        if resolved:
+            await self.apply(resolved)
+        if rechecks:
+            await self._call(self.store.update_many, rechecks)
+
+        self.runs += 1
+        self.last_run_seconds = time.monotonic() - began
+        return len(resolved)
+
+    async def run(self):
+        while True:
+            try:
+                if self.lease is not None:
+                    self.leader = await self._call(self.lease)
+                if self.leader:
+                    await self.reconcile_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning("Pending reconciliation failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "checked": self.checked,
+            "resolved": dict(self.resolved),
+            "unresolved": self.unresolved,
+            "errors": self.errors,
+            "leader": self.leader,
+            "last_run_seconds": round(self.last_run_seconds, 3)
+        }
@@ -0,0 +1,431 @@
+"""
+Reconciliation report
+Diffs the local store against Paystack for a date range and writes missing,
+extra and mismatched records as NDJSON. Paystack only lists by date, so its
+history is first pulled window by window into an on-disk table keyed by
+reference (an external sort); both sides are then walked in reference order
+a page at a time with a merge join, so memory stays flat however many
+records there are. Progress is checkpointed and an interrupted job resumes
+where it stopped.
+"""
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from codec import dumps, loads
+from export import iter_pages
+from models import TERMINAL_STATUSES, from_epoch_ms, from_kobo, to_epoch_ms, to_kobo
+from storage import TransactionStore
+
+
+logger = logging.getLogger(__name__)
+
+FETCHING = "fetching"
+MERGING = "merging"
+DONE = "done"
+FAILED = "failed"
+RUNNING = "running"  # reported for a report another worker is working on
+
+_REPORT_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+def report_id(start_ms: int, end_ms: int) -> str:
+    """Stable id for a date range, so starting the same range again resumes it"""
+    return hashlib.sha1(f"{start_ms}:{end_ms}".encode()).hexdigest()[:16]
+
+
+def report_dir(directory: str, report: str) -> Optional[str]:
+    """Working directory of a report, or None for a malformed id"""
+    return os.path.join(directory, report) if _REPORT_ID.match(report) else None
+
+
+def load_state(directory: str, report: str) -> Optional[dict]:
+    """Last checkpoint of a report, or None if it was never started"""
+    path = report_dir(directory, report)
+    try:
+        with open(os.path.join(path, "state.json"), "rb") as f:
+            return loads(f.read())
+    except (TypeError, OSError):
+        return None
+
+
+def _try_lock(path: str) -> Optional[int]:
+    """Descriptor holding an exclusive lock on path, or None if another holds it"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def report_running(directory: str, report: str) -> bool:
+    """Whether a job in any worker process currently holds the report"""
+    path = report_dir(directory, report)
+    if path is None or not os.path.isdir(path):
+        return False
+    fd = _try_lock(os.path.join(path, "lock"))
+    if fd is None:
+        return True
+    os.close(fd)
+    return False
+
+
+def describe(state: dict, error: Optional[str] = None) -> dict:
+    """Progress of a report as shown by the API"""
+    stats = {key: value for key, value in state.items() if key not in ("after", "offset")}
+    stats["counts"] = dict(state["counts"])
+    stats["fetched_until"] = from_epoch_ms(state["fetched_until"])
+    if error is not None:
+        stats["status"] = FAILED
+        stats["error"] = error
+    return stats
+
+
+def settled_status(status: Optional[str]) -> str:
+    """Terminal statuses compare as they are; every in-flight status counts as pending"""
+    return status if status in TERMINAL_STATUSES else "pending"
+
+
+class ReconciliationJob:
+    """
+    Two phases, both resumable. Fetch pulls [start - slack, end + slack] from
+    Paystack in `window`-second slices (checkpointing after each slice) into
+    upstream.db. Merge walks that table and the local store in reference
+    order, `batch_size` records at a time, checkpointing the last reference
+    and the report's byte offset after each batch. The slack catches records
+    whose local and Paystack timestamps straddle the range; one-sided records
+    are only reported when their own timestamp falls inside the range.
+    """
+
+    def __init__(
+        self,
+        store: TransactionStore,
+        fetch_page: Callable[[dict], Awaitable[dict]],
+        directory: str,
+        start_ms: int,
+        end_ms: int,
+        window: float = 86400.0,
+        slack: float = 3600.0,
+        page_size: int = 100,
+        prefetch: int = 4,
+        batch_size: int = 1000,
+        offload: bool = False,
+        max_retries: int = 5,
+        retry_delay: float = 30.0
+    ):
+        self.store = store
+        self.fetch_page = fetch_page
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.window_ms = int(window * 1000)
+        self.slack_ms = int(slack * 1000)
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.batch_size = batch_size
+        self.offload = offload  # read the store off the event loop (SQLite)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.id = report_id(start_ms, end_ms)
+        self.reports_directory = directory
+        self.directory = report_dir(directory, self.id)
+        self.report_path = os.path.join(self.directory, "report.ndjson")
+        self._state_path = os.path.join(self.directory, "state.json")
+        self._upstream_path = os.path.join(self.directory, "upstream.db")
+        self._lock_path = os.path.join(self.directory, "lock")
+        self._lock_fd: Optional[int] = None
+        os.makedirs(self.directory, exist_ok=True)
+        self.state = load_state(directory, self.id) or {
+            "id": self.id,
+            "status": FETCHING,
+            "from": from_epoch_ms(start_ms),
+            "to": from_epoch_ms(end_ms),
+            "fetched_until": start_ms - self.slack_ms,
+            "pages": 0,
+            "upstream_fetched": 0,
+            "after": None,
+            "offset": 0,
+            "local_scanned": 0,
+            "upstream_scanned": 0,
+            "counts": {"matched": 0, "missing": 0, "extra": 0, "mismatch": 0},
+            "started_at": time.time(),
+            "finished_at": None
+        }
+        self.error: Optional[str] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # Checkpoints
+
+    def _save_state(self):
+        # Write then rename, so a crash never leaves a torn checkpoint
+        temp = self._state_path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(dumps(self.state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self._state_path)
+
+    def _open_upstream(self):
+        self._conn = sqlite3.connect(self._upstream_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS upstream (
+                reference TEXT PRIMARY KEY,
+                status TEXT,
+                amount INTEGER,
+                created_at INTEGER
+            ) WITHOUT ROWID
+        """)
+
+    def _close_upstream(self, remove: bool = False):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if remove:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self._upstream_path + suffix)
+                except FileNotFoundError:
+                    pass
+
+    # Fetch phase
+
+    def _insert_upstream(self, rows: List[tuple]):
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany("INSERT OR REPLACE INTO upstream VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def _fetch_window(self, window_start: int, window_end: int):
+        params = {
+            "perPage": self.page_size,
+            "from": from_epoch_ms(window_start),
+            "to": from_epoch_ms(window_end - 1)
+        }
+        async for page in iter_pages(self.fetch_page, params, window=self.prefetch):
+            rows = [
+                (txn["reference"], txn.get("status"), to_kobo(txn.get("amount")), to_epoch_ms(txn.get("created_at")))
+                for txn in page["data"] if txn.get("reference")
+            ]
+            await asyncio.to_thread(self._insert_upstream, rows)
+            self.state["pages"] += 1
+            self.state["upstream_fetched"] += len(rows)
+
+    async def _fetch(self):
+        end = self.end_ms + self.slack_ms + 1
+        failures = 0
+        while self.state["fetched_until"] < end:
+            window_start = self.state["fetched_until"]
+            window_end = min(end, window_start + self.window_ms)
+            try:
+                # Re-fetching part of a window is harmless: rows are keyed by reference
+                await self._fetch_window(window_start, window_end)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                if failures > self.max_retries:
+                    raise
+                delay = getattr(e, "retry_after", None) or self.retry_delay
+                logger.warning("Reconciliation %s fetch failed, retrying in %.0fs: %s", self.id, delay, e)
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            self.state["fetched_until"] = window_end
+            await asyncio.to_thread(self._save_state)
+
+    # Merge phase
+
+    def _in_range(self, created_at: Optional[int]) -> bool:
+        return created_at is not None and self.start_ms <= created_at <= self.end_ms
+
+    async def _local_rows(self, after: Optional[str]) -> AsyncIterator[dict]:
+        created_from = from_epoch_ms(self.start_ms - self.slack_ms)
+        created_to = from_epoch_ms(self.end_ms + self.slack_ms)
+        while True:
+            if self.offload:
+                page = await asyncio.to_thread(self.store.scan, after, self.batch_size, created_from, created_to)
+            else:
+                page = self.store.scan(after, self.batch_size, created_from, created_to)
+            for record in page:
+                yield record
+            if len(page) < self.batch_size:
+                return
+            after = page[-1]["reference"]
+
+    def _read_upstream(self, after: str) -> List[tuple]:
+        return self._conn.execute(
+            "SELECT reference, status, amount, created_at FROM upstream WHERE reference > ? ORDER BY reference LIMIT ?",
+            (after, self.batch_size)
+        ).fetchall()
+
+    async def _upstream_rows(self, after: Optional[str]) -> AsyncIterator[tuple]:
+        after = after or ""
+        while True:
+            page = await asyncio.to_thread(self._read_upstream, after)
+            for row in page:
+                yield row
+            if len(page) < self.batch_size:
+                return
+            after = page[-1][0]
+
+    @staticmethod
+    def _local_view(record: dict) -> dict:
+        return {"status": record.get("status"), "amount": record.get("amount"), "created_at": record.get("created_at")}
+
+    @staticmethod
+    def _upstream_view(row: tuple) -> dict:
+        return {"status": row[1], "amount": from_kobo(row[2]), "created_at": from_epoch_ms(row[3])}
+
+    def _diff(self, local: Optional[dict], upstream: Optional[tuple]) -> Optional[dict]:
+        """Report entry for one reference, or None when it matches or is out of range"""
+        if upstream is None:
+            if not self._in_range(to_epoch_ms(local.get("created_at"))):
+                return None
+            return {"type": "extra", "reference": local["reference"], "local": self._local_view(local)}
+        if not self._in_range(upstream[3]):
+            return None  # reported by the run whose range holds Paystack's timestamp
+        if local is None:
+            return {"type": "missing", "reference": upstream[0], "paystack": self._upstream_view(upstream)}
+
+        fields = []
+        if settled_status(local.get("status")) != settled_status(upstream[1]):
+            fields.append("status")
+        if to_kobo(local.get("amount")) != upstream[2]:
+            fields.append("amount")
+        if not fields:
+            self.state["counts"]["matched"] += 1
+            return None
+        return {
+            "type": "mismatch",
+            "reference": upstream[0],
+            "fields": fields,
+            "local": self._local_view(local),
+            "paystack": self._upstream_view(upstream)
+        }
+
+    def _checkpoint(self, report, lines: List[bytes], after: Optional[str]):
+        report.write(b"".join(lines))
+        report.flush()
+        os.fsync(report.fileno())
+        self.state["after"] = after
+        self.state["offset"] = report.tell()
+        self._save_state()
+
+    async def _merge(self):
+        after = self.state["after"]
+        local_rows = self._local_rows(after)
+        upstream_rows = self._upstream_rows(after)
+        counts = self.state["counts"]
+
+        mode = "r+b" if os.path.exists(self.report_path) else "w+b"
+        with open(self.report_path, mode) as report:
+            # Drop anything written after the last checkpoint
+            report.truncate(self.state["offset"])
+            report.seek(self.state["offset"])
+
+            lines: List[bytes] = []
+            processed = 0
+            local = await anext(local_rows, None)
+            upstream = await anext(upstream_rows, None)
+            while local is not None or upstream is not None:
+                if upstream is None or (local is not None and local["reference"] < upstream[0]):
+                    reference, entry = local["reference"], self._diff(local, None)
+                    local = await anext(local_rows, None)
+                    self.state["local_scanned"] += 1
+                elif local is None or upstream[0] < local["reference"]:
+                    reference, entry = upstream[0], self._diff(None, upstream)
+                    upstream = await anext(upstream_rows, None)
+                    self.state["upstream_scanned"] += 1
+                else:
+                    reference, entry = upstream[0], self._diff(local, upstream)
+                    local = await anext(local_rows, None)
+                    upstream = await anext(upstream_rows, None)
+                    self.state["local_scanned"] += 1
+                    self.state["upstream_scanned"] += 1
+
+                if entry is not None:
+                    counts[entry["type"]] += 1
+                    lines.append(dumps(entry) + b"\n")
+                processed += 1
+                if processed % self.batch_size == 0:
+                    await asyncio.to_thread(self._checkpoint, report, lines, reference)
+                    lines = []
+
+            summary = {"type": "summary", "from": self.state["from"], "to": self.state["to"], **counts}
+            lines.append(dumps(summary) + b"\n")
+            self.state["status"] = DONE
+            self.state["finished_at"] = time.time()
+            await asyncio.to_thread(self._checkpoint, report, lines, self.state["after"])
+
+    # Lifecycle
+
+    async def run(self):
+        try:
+            await asyncio.to_thread(self._open_upstream)
+            if self.state["status"] == FETCHING:
+                await self._fetch()
+                self.state["status"] = MERGING
+                await asyncio.to_thread(self._save_state)
+            if self.state["status"] == MERGING:
+                await self._merge()
+            self._close_upstream(remove=True)
+        except asyncio.CancelledError:
+            self._close_upstream()
+            raise
+        except Exception as e:
+            # The checkpoint on disk is left as it was, so a restart resumes from it
+            self.error = str(e)
+            self._close_upstream()
+            logger.warning("Reconciliation %s failed: %s", self.id, e)
+        finally:
+            self._release_lock()
+
+    def _release_lock(self):
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def start(self) -> bool:
+        """
+        Start (or resume) the job under the report's lock file, so one worker
+        process at a time works on it. False if another already holds it.
+        """
+        if self._task is None:
+            self._lock_fd = _try_lock(self._lock_path)
+            if self._lock_fd is None:
+                return False
+            # The previous holder may have moved on since this job was built
+            self.state = load_state(self.reports_directory, self.id) or self.state
+            self._task = asyncio.create_task(self.run())
+        return True
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Cancelled before run() got to release it
+        self._release_lock()
+
+    def stats(self) -> dict:
+        return describe(self.state, self.error)
@@ -0,0 +1,54 @@
+"""
+Transaction reference generator
+ULID-style references: a 48-bit millisecond timestamp followed by 80 random
+bits, Crockford base32 encoded. They sort by creation time (good index
+locality) and are unique across processes without coordination.
+"""
+import os
+import threading
+import time
+
+
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class ReferenceGenerator:
+    """
+    Monotonic within a process: references minted in the same millisecond
+    (or while the clock steps backwards) increment the random part instead
+    of drawing a new one. Each new millisecond draws fresh randomness from
+    os.urandom, so forked workers never share a sequence.
+    """
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def next(self) -> str:
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                # Top bit clear leaves room to increment within one millisecond
+                self._last_random = int.from_bytes(os.urandom(10), "big") >> 1
+            elif self._last_random < _RANDOM_MAX:
+                self._last_random += 1
+            else:
+                self._last_ms += 1  # random space exhausted: borrow the next millisecond
+                self._last_random = int.from_bytes(os.urandom(10), "big") >> 1
+            value = (self._last_ms << _RANDOM_BITS) | self._last_random
+        return self.prefix + _encode(value, 26)
+
+    __call__ = next
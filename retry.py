@@ -0,0 +1,145 @@
+"""
+Retries and hedged requests for upstream calls
+Exponential backoff with full jitter under a per-request budget, and
+hedging (a second copy of a slow call) under a global hedge budget
+"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, FrozenSet, Optional, Tuple, Type
+
+import httpx
+
+
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Errors proving a request never reached the server, so even a call that is
+# not idempotent can be repeated (a read timeout may follow a committed write)
+UNDELIVERED_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RetryPolicy:
+    """
+    Retries `retry_on` errors (by default transport errors and timeouts) and
+    `retry_statuses` responses. Each retry sleeps a random delay in [0, min(max_delay, base_delay * 2**attempt)]
+    (full jitter); a request stops retrying after `max_attempts` calls or
+    once `budget` seconds have passed since its first call.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+        budget: float = 5.0,
+        retry_on: Tuple[Type[Exception], ...] = (httpx.TransportError,),
+        retry_statuses: FrozenSet[int] = RETRYABLE_STATUS_CODES
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retry_on = retry_on
+        self.retry_statuses = retry_statuses
+        self.calls = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def run(self, call: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Return the first non-retryable response (or the last one once out of budget)"""
+        self.calls += 1
+        deadline = time.monotonic() + self.budget
+        attempt = 0
+        while True:
+            try:
+                response = await call()
+                if response.status_code not in self.retry_statuses:
+                    return response
+                failure: Optional[BaseException] = None
+            except self.retry_on as e:
+                response, failure = None, e
+
+            attempt += 1
+            delay = self.backoff(attempt)
+            if attempt >= self.max_attempts or time.monotonic() + delay > deadline:
+                self.exhausted += 1
+                if failure is not None:
+                    raise failure
+                return response
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "exhausted": self.exhausted
+        }
+
+
+class Hedger:
+    """
+    Sends a second copy of a call that has not answered within `delay` and
+    takes whichever answers first. Every call earns `budget_ratio` of a hedge
+    (capped at `max_tokens`) and each hedge spends one, so hedges stay a fixed
+    fraction of traffic however slow the upstream gets.
+    """
+
+    def __init__(self, budget_ratio: float = 0.05, max_tokens: float = 10.0):
+        self.budget_ratio = budget_ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    async def run(self, call: Callable[[], Awaitable[Any]], delay: Optional[float]) -> Any:
+        self.calls += 1
+        self.tokens = min(self.max_tokens, self.tokens + self.budget_ratio)
+        primary = asyncio.ensure_future(call())
+        if delay is None:
+            return await primary
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(primary), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            primary.cancel()
+            raise
+
+        if self.tokens < 1:
+            self.denied += 1
+            return await primary
+        self.tokens -= 1
+        self.hedged += 1
+        hedge = asyncio.ensure_future(call())
+
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                if not pending:
+                    # Both failed: surface the primary's error
+                    return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "denied_by_budget": self.denied,
+            "budget_tokens": round(self.tokens, 2)
+        }
@@ -0,0 +1,160 @@
+"""
+Cross-process transaction state
+Every uvicorn worker reads and writes the same SQLite store. Each worker
+keeps hot records in a local cache and follows the store's change log so
+writes made by other workers invalidate it.
+"""
+import asyncio
+import logging
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from cache import TTLCache
+from storage import SQLiteTransactionStore, TransactionStore
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedTransactionStore(TransactionStore):
+    """Wraps a shared backend with a per-process LRU of hot records"""
+
+    def __init__(self, backend: TransactionStore, max_size: int = 10000):
+        self.backend = backend
+        self.cache = TTLCache(max_size=max_size)
+
+    def get(self, reference: str) -> Optional[dict]:
+        record = self.cache.get(reference)
+        if record is None:
+            record = self.backend.get(reference)
+            if record is None:
+                return None
+            self.cache.set(reference, record)
+        return dict(record)
+
+    def insert(self, record: dict):
+        self.backend.insert(record)
+        self.cache.invalidate(record["reference"])
+
+    def insert_many(self, records: Iterable[dict]):
+        records = list(records)
+        self.backend.insert_many(records)
+        for record in records:
+            self.cache.invalidate(record["reference"])
+
+    def update(self, reference: str, **fields) -> bool:
+        updated = self.backend.update(reference, **fields)
+        self.cache.invalidate(reference)
+        return updated
+
+    def update_many(self, updates: Iterable[Tuple[str, dict]]) -> int:
+        updates = list(updates)
+        updated = self.backend.update_many(updates)
+        for reference, _ in updates:
+            self.cache.invalidate(reference)
+        return updated
+
+    def delete_many(self, references: Iterable[str]) -> int:
+        references = list(references)
+        deleted = self.backend.delete_many(references)
+        for reference in references:
+            self.cache.invalidate(reference)
+        return deleted
+
+    def list(self, *args, **kwargs) -> List[dict]:
+        return self.backend.list(*args, **kwargs)
+
+    def scan(self, *args, **kwargs) -> List[dict]:
+        return self.backend.scan(*args, **kwargs)
+
+    def due_for_check(self, *args, **kwargs) -> List[dict]:
+        return self.backend.due_for_check(*args, **kwargs)
+
+    def count(self) -> int:
+        return self.backend.count()
+
+    def invalidate(self, reference: str, status: Optional[str] = None):
+        self.cache.invalidate(reference)
+
+    def close(self):
+        self.backend.close()
+
+
+class ChangeFeed:
+    """
+    Polls the SQLite change log and notifies listeners of (reference, status),
+    with status None when the record was deleted
+    """
+
+    def __init__(
+        self,
+        store: SQLiteTransactionStore,
+        interval: float = 0.5,
+        retention: int = 100000
+    ):
+        self.store = store
+        self.interval = interval
+        self.retention = retention
+        self.listeners: List[Callable[[str, Optional[str]], None]] = []
+        self.last_seq = store.latest_change()
+        self.last_data_version = store.data_version()
+        self.changes_seen = 0
+        self.polls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, listener: Callable[[str, Optional[str]], None]):
+        self.listeners.append(listener)
+
+    def poll(self) -> int:
+        """Deliver changes committed since the last poll, returning how many"""
+        self.polls += 1
+        version = self.store.data_version()
+        if version == self.last_data_version:
+            return 0  # nothing committed by another process
+        self.last_data_version = version
+
+        delivered = 0
+        while True:
+            changes = self.store.changes_since(self.last_seq)
+            if not changes:
+                break
+            for seq, reference, status in changes:
+                for listener in self.listeners:
+                    listener(reference, status)
+                self.last_seq = seq
+            delivered += len(changes)
+
+        self.changes_seen += delivered
+        if self.polls % 1000 == 0:
+            self.store.prune_changes(self.retention)
+        return delivered
+
+    async def run(self):
+        while True:
+            try:
+                self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Change feed poll failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "last_seq": self.last_seq,
+            "changes_seen": self.changes_seen,
+            "polls": self.polls,
+            "listeners": len(self.listeners)
+        }
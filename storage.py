@@ -0,0 +1,669 @@
+"""
+Transaction storage
+A small storage interface with an in-memory backend (for the demo and
+tests), a SQLite backend running in WAL mode (for persistence) and a
+tiered backend that bounds memory by spilling to SQLite
+"""
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import TERMINAL_STATUSES, Transaction, from_epoch_ms, to_epoch_ms
+
+
+# Columns stored for each local transaction record
+COLUMNS = (
+    "reference",
+    "email",
+    "amount",
+    "name",
+    "status",
+    "created_at",
+    "verified_at",
+    "gateway_response",
+    "paid_at",
+    "channel",
+    "webhook_received_at",
+    "amount_paid",
+    "next_check_at",
+    "checks",
+)
+_COLUMN_SET = frozenset(COLUMNS)
+
+# Stored as fixed-width UTC strings (2024-01-01T10:00:00.000Z) so SQLite's
+# string comparisons order them by time whatever form the caller passed
+TIMESTAMP_COLUMNS = frozenset({"created_at", "verified_at", "paid_at", "webhook_received_at", "next_check_at"})
+
+
+def normalize_timestamp(value):
+    """ISO 8601 string (naive values are local time) to fixed-width UTC"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return from_epoch_ms(to_epoch_ms(value))
+    except ValueError:
+        return value
+
+
+def _newest_first(record: Transaction) -> Tuple[int, str]:
+    return (record.created_at or 0, record.reference)
+
+
+def _matches(record: Transaction, status, email, start, end) -> bool:
+    """Whether an in-memory record passes the list() filters"""
+    created = record.created_at or 0
+    return (
+        (status is None or record.status == status)
+        and (email is None or record.email == email)
+        and (start is None or created >= start)
+        and (end is None or created <= end)
+    )
+
+
+def _check_priority(record: dict) -> Tuple[int, float]:
+    """due_for_check() order: newest hour first, highest amount first within it"""
+    created_hour = (to_epoch_ms(record.get("created_at")) or 0) // 3_600_000
+    return (-created_hour, -(record.get("amount") or 0))
+
+
+def _due_in_memory(records: Iterable[Transaction], start: int, end: int, now: int, limit: int) -> List[dict]:
+    """due_for_check() over in-memory records: one pass, then a bounded heap"""
+    due = (
+        record.to_record() for record in records
+        if record.status not in TERMINAL_STATUSES
+        and start <= (record.created_at or 0) <= end
+        and (record.next_check_at is None or record.next_check_at <= now)
+    )
+    return heapq.nsmallest(limit, due, key=_check_priority)
+
+
+def _check_fields(fields: dict):
+    unknown = set(fields) - _COLUMN_SET
+    if unknown:
+        raise ValueError(f"Unknown transaction fields: {', '.join(sorted(unknown))}")
+
+
+class TransactionStore(ABC):
+    """Interface every transaction backend implements"""
+
+    @abstractmethod
+    def get(self, reference: str) -> Optional[dict]:
+        """Return the record for a reference, or None"""
+
+    @abstractmethod
+    def insert(self, record: dict):
+        """Insert (or replace) one record"""
+
+    @abstractmethod
+    def insert_many(self, records: Iterable[dict]):
+        """Insert (or replace) many records in one batch"""
+
+    @abstractmethod
+    def update(self, reference: str, **fields) -> bool:
+        """Update fields of an existing record; False if it does not exist"""
+
+    @abstractmethod
+    def update_many(self, updates: Iterable[Tuple[str, dict]]) -> int:
+        """Apply (reference, fields) updates in one batch; returns rows updated"""
+
+    @abstractmethod
+    def delete_many(self, references: Iterable[str]) -> int:
+        """Delete records by reference; returns rows deleted"""
+
+    @abstractmethod
+    def list(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        status: Optional[str] = None,
+        email: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None
+    ) -> List[dict]:
+        """Records matching the filters, newest first (ties by reference, descending)"""
+
+    @abstractmethod
+    def scan(
+        self,
+        after: Optional[str] = None,
+        limit: int = 1000,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None
+    ) -> List[dict]:
+        """Records with a reference greater than `after`, in reference order (keyset paging)"""
+
+    @abstractmethod
+    def due_for_check(self, created_from: str, created_to: str, now: str, limit: int) -> List[dict]:
+        """
+        Unresolved records created in [created_from, created_to] whose
+        next_check_at is unset or not after `now`, newest hour first and
+        highest amount first within it; at most `limit`
+        """
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored records"""
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+
+class MemoryTransactionStore(TransactionStore):
+    """Compact in-process store of Transaction records; lost on restart"""
+
+    def __init__(self):
+        self._records: Dict[str, Transaction] = {}
+
+    def get(self, reference: str) -> Optional[dict]:
+        record = self._records.get(reference)
+        return record.to_record() if record is not None else None
+
+    def insert(self, record: dict):
+        _check_fields(record)
+        self._records[record["reference"]] = Transaction.from_dict(record)
+
+    def insert_many(self, records: Iterable[dict]):
+        for record in records:
+            self.insert(record)
+
+    def update(self, reference: str, **fields) -> bool:
+        _check_fields(fields)
+        record = self._records.get(reference)
+        if record is None:
+            return False
+        record.update(fields, skip_none=False)
+        return True
+
+    def update_many(self, updates: Iterable[Tuple[str, dict]]) -> int:
+        return sum(1 for reference, fields in updates if self.update(reference, **fields))
+
+    def delete_many(self, references: Iterable[str]) -> int:
+        return sum(1 for reference in references if self._records.pop(reference, None) is not None)
+
+    def list(self, limit=100, offset=0, status=None, email=None, created_from=None, created_to=None) -> List[dict]:
+        matches = [record for record in self._records.values() if _matches(
+            record, status, email, to_epoch_ms(created_from), to_epoch_ms(created_to)
+        )]
+        matches.sort(key=_newest_first, reverse=True)
+        return [record.to_record() for record in matches[offset:offset + limit]]
+
+    def scan(self, after=None, limit=1000, created_from=None, created_to=None) -> List[dict]:
+        start = to_epoch_ms(created_from)
+        end = to_epoch_ms(created_to)
+        matches = [
+            record for record in list(self._records.values())
+            if (after is None or record.reference > after)
+            and (start is None or (record.created_at or 0) >= start)
+            and (end is None or (record.created_at or 0) <= end)
+        ]
+        return [record.to_record() for record in heapq.nsmallest(limit, matches, key=lambda record: record.reference)]
+
+    def due_for_check(self, created_from, created_to, now, limit) -> List[dict]:
+        return _due_in_memory(
+            list(self._records.values()), to_epoch_ms(created_from), to_epoch_ms(created_to), to_epoch_ms(now), limit
+        )
+
+    def count(self) -> int:
+        return len(self._records)
+
+
+class SQLiteTransactionStore(TransactionStore):
+    """
+    SQLite store in WAL mode with indexes on reference, email, status and
+    created_at (email and status are paired with created_at so filtered,
+    newest-first listings are served straight from the index)
+    """
+
+    _INSERT_SQL = (
+        f"INSERT OR REPLACE INTO transactions ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in COLUMNS)})"
+    )
+    _SELECT_SQL = f"SELECT {', '.join(COLUMNS)} FROM transactions"
+    # Inlined rather than bound so the planner can match the partial index
+    _UNRESOLVED_SQL = f"status NOT IN ({', '.join(repr(status) for status in sorted(TERMINAL_STATUSES))})"
+
+    def __init__(self, path: str = "transactions.db", change_log: bool = True):
+        self.path = path
+        self.change_log = change_log  # log writes for other workers' ChangeFeed
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            isolation_level=None,  # explicit BEGIN/COMMIT for batches
+            cached_statements=256  # keep prepared statements for hot queries
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS transactions (
+                    reference TEXT PRIMARY KEY,
+                    email TEXT,
+                    amount REAL,
+                    name TEXT,
+                    status TEXT,
+                    created_at TEXT,
+                    verified_at TEXT,
+                    gateway_response TEXT,
+                    paid_at TEXT,
+                    channel TEXT,
+                    webhook_received_at TEXT,
+                    amount_paid REAL,
+                    next_check_at TEXT,
+                    checks INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_transactions_email ON transactions (email, created_at);
+                CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions (status, created_at);
+                CREATE INDEX IF NOT EXISTS idx_transactions_created_at ON transactions (created_at);
+
+                -- Append-only change log read by other worker processes
+                CREATE TABLE IF NOT EXISTS transaction_changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    reference TEXT NOT NULL,
+                    status TEXT
+                );
+
+                -- Named leases so one worker at a time runs a background job
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+            """)
+            if self.change_log:
+                self._conn.executescript("""
+                    CREATE TRIGGER IF NOT EXISTS trg_transactions_insert AFTER INSERT ON transactions
+                    BEGIN
+                        INSERT INTO transaction_changes (reference, status) VALUES (NEW.reference, NEW.status);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS trg_transactions_update AFTER UPDATE ON transactions
+                    BEGIN
+                        INSERT INTO transaction_changes (reference, status) VALUES (NEW.reference, NEW.status);
+                    END;
+                    -- A deleted record is logged with no status
+                    CREATE TRIGGER IF NOT EXISTS trg_transactions_delete AFTER DELETE ON transactions
+                    BEGIN
+                        INSERT INTO transaction_changes (reference, status) VALUES (OLD.reference, NULL);
+                    END;
+                """)
+            else:
+                self._conn.executescript("""
+                    DROP TRIGGER IF EXISTS trg_transactions_insert;
+                    DROP TRIGGER IF EXISTS trg_transactions_update;
+                    DROP TRIGGER IF EXISTS trg_transactions_delete;
+                    DELETE FROM transaction_changes;
+                """)
+            # Columns added after the first release
+            existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(transactions)")}
+            for column, kind in (("next_check_at", "TEXT"), ("checks", "INTEGER")):
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE transactions ADD COLUMN {column} {kind}")
+            # Only unresolved records, so the reconciler's query never walks settled ones
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transactions_unresolved ON transactions (created_at, next_check_at) "
+                f"WHERE {self._UNRESOLVED_SQL}"
+            )
+            # Rewrite timestamps stored in other forms (naive local time) by older versions
+            self._conn.create_function("normalize_timestamp", 1, normalize_timestamp, deterministic=True)
+            columns = sorted(TIMESTAMP_COLUMNS)
+            assignments = ", ".join(f"{column} = normalize_timestamp({column})" for column in columns)
+            outdated = " OR ".join(f"{column} NOT LIKE '%Z'" for column in columns)
+            self._conn.execute(f"UPDATE transactions SET {assignments} WHERE {outdated}")
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> dict:
+        return {key: row[key] for key in row.keys() if row[key] is not None}
+
+    def get(self, reference: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"{self._SELECT_SQL} WHERE reference = ?", (reference,)).fetchone()
+        return self._row_to_dict(row) if row is not None else None
+
+    def insert(self, record: dict):
+        self.insert_many([record])
+
+    def insert_many(self, records: Iterable[dict]):
+        rows = []
+        for record in records:
+            _check_fields(record)
+            rows.append(tuple(
+                normalize_timestamp(record.get(column)) if column in TIMESTAMP_COLUMNS else record.get(column)
+                for column in COLUMNS
+            ))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(self._INSERT_SQL, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def update(self, reference: str, **fields) -> bool:
+        return self.update_many([(reference, fields)]) > 0
+
+    def update_many(self, updates: Iterable[Tuple[str, dict]]) -> int:
+        # Group by field set so each group runs as one prepared statement
+        groups: Dict[Tuple[str, ...], list] = {}
+        for reference, fields in updates:
+            _check_fields(fields)
+            if not fields:
+                continue
+            names = tuple(sorted(fields))
+            values = tuple(
+                normalize_timestamp(fields[name]) if name in TIMESTAMP_COLUMNS else fields[name]
+                for name in names
+            )
+            groups.setdefault(names, []).append(values + (reference,))
+
+        updated = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for names, rows in groups.items():
+                    assignments = ", ".join(f"{name} = ?" for name in names)
+                    sql = f"UPDATE transactions SET {assignments} WHERE reference = ?"
+                    if len(rows) == 1:
+                        updated += self._conn.execute(sql, rows[0]).rowcount
+                    else:
+                        updated += self._conn.executemany(sql, rows).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return updated
+
+    def list(self, limit=100, offset=0, status=None, email=None, created_from=None, created_to=None) -> List[dict]:
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if email is not None:
+            clauses.append("email = ?")
+            params.append(email)
+        if created_from is not None:
+            clauses.append("created_at >= ?")
+            params.append(normalize_timestamp(created_from))
+        if created_to is not None:
+            clauses.append("created_at <= ?")
+            params.append(normalize_timestamp(created_to))
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"{self._SELECT_SQL}{where} ORDER BY created_at DESC, reference DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit, offset)).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def scan(self, after=None, limit=1000, created_from=None, created_to=None) -> List[dict]:
+        # Unary + keeps the planner on the primary key: ordering by the
+        # created_at index would sort the whole date range for every page
+        clauses, params = [], []
+        if after is not None:
+            clauses.append("reference > ?")
+            params.append(after)
+        if created_from is not None:
+            clauses.append("+created_at >= ?")
+            params.append(normalize_timestamp(created_from))
+        if created_to is not None:
+            clauses.append("+created_at <= ?")
+            params.append(normalize_timestamp(created_to))
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"{self._SELECT_SQL}{where} ORDER BY reference LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def due_for_check(self, created_from, created_to, now, limit) -> List[dict]:
+        sql = (
+            f"{self._SELECT_SQL} WHERE {self._UNRESOLVED_SQL} AND created_at >= ? AND created_at <= ? "
+            "AND (next_check_at IS NULL OR next_check_at <= ?) "
+            "ORDER BY substr(created_at, 1, 13) DESC, amount DESC LIMIT ?"
+        )
+        params = (normalize_timestamp(created_from), normalize_timestamp(created_to), normalize_timestamp(now), limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the named lease for `ttl` seconds; False while another owner holds it"""
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+                (name, owner, now + ttl, now)
+            ).rowcount > 0
+
+    def release_lease(self, name: str, owner: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def delete_many(self, references: Iterable[str]) -> int:
+        rows = [(reference,) for reference in references]
+        with self._lock:
+            return self._conn.executemany("DELETE FROM transactions WHERE reference = ?", rows).rowcount
+
+    def data_version(self) -> int:
+        """Changes whenever another connection (worker) commits to the database"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def latest_change(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM transaction_changes").fetchone()[0]
+
+    def changes_since(self, seq: int, limit: int = 10000) -> List[Tuple[int, str, Optional[str]]]:
+        """(seq, reference, status) change entries after seq, oldest first; status is None for a delete"""
+        with self._lock:
+            return [
+                tuple(row) for row in self._conn.execute(
+                    "SELECT seq, reference, status FROM transaction_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (seq, limit)
+                )
+            ]
+
+    def prune_changes(self, keep: int = 100000) -> int:
+        """Drop all but the newest `keep` change entries"""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM transaction_changes WHERE seq <= (SELECT MAX(seq) FROM transaction_changes) - ?",
+                (keep,)
+            ).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredTransactionStore(TransactionStore):
+    """
+    Bounded in-memory hot tier that spills to a SQLite cold tier.
+    Records leave the hot tier when it is over max_size (least recently
+    used first), when a pending record is older than pending_max_age, or
+    when a terminal record is older than terminal_max_age. Spilled records
+    stay reachable by reference and are promoted back on update.
+    """
+
+    def __init__(
+        self,
+        cold: "SQLiteTransactionStore",
+        max_size: int = 100000,
+        pending_max_age: float = 3600.0,
+        terminal_max_age: float = 600.0,
+        spill_batch: int = 1000
+    ):
+        self.cold = cold
+        self.max_size = max_size
+        self.pending_max_age = pending_max_age
+        self.terminal_max_age = terminal_max_age
+        self.spill_batch = spill_batch
+        self._hot: "OrderedDict[str, Transaction]" = OrderedDict()
+        self.evictions = {"size": 0, "pending_age": 0, "terminal_age": 0}
+        self.cold_hits = 0
+        self.promotions = 0
+
+    def _spill(self, references: List[str], reason: str):
+        records = [self._hot.pop(reference).to_record() for reference in references]
+        for i in range(0, len(records), self.spill_batch):
+            self.cold.insert_many(records[i:i + self.spill_batch])
+        self.evictions[reason] += len(records)
+
+    def _enforce_size(self):
+        overflow = len(self._hot) - self.max_size
+        if overflow > 0:
+            # Evict a little extra so inserts do not spill one record at a time
+            count = min(len(self._hot), overflow + max(self.max_size // 100, 1))
+            self._spill([reference for reference, _ in zip(self._hot, range(count))], "size")
+
+    def sweep(self) -> int:
+        """Spill records that aged out of the hot tier, returning how many"""
+        now = int(time.time() * 1000)
+        pending_cutoff = now - int(self.pending_max_age * 1000)
+        terminal_cutoff = now - int(self.terminal_max_age * 1000)
+        stale_pending, stale_terminal = [], []
+        for reference, record in self._hot.items():
+            created = record.created_at or now
+            if record.status in TERMINAL_STATUSES:
+                if created < terminal_cutoff:
+                    stale_terminal.append(reference)
+            elif created < pending_cutoff:
+                stale_pending.append(reference)
+        if stale_pending:
+            self._spill(stale_pending, "pending_age")
+        if stale_terminal:
+            self._spill(stale_terminal, "terminal_age")
+        return len(stale_pending) + len(stale_terminal)
+
+    def _promote(self, reference: str) -> Optional[Transaction]:
+        record = self.cold.get(reference)
+        if record is None:
+            return None
+        self.cold.delete_many([reference])
+        transaction = Transaction.from_dict(record)
+        self._hot[reference] = transaction
+        self.promotions += 1
+        self._enforce_size()
+        return transaction
+
+    def get(self, reference: str) -> Optional[dict]:
+        record = self._hot.get(reference)
+        if record is not None:
+            self._hot.move_to_end(reference)
+            return record.to_record()
+        record = self.cold.get(reference)
+        if record is not None:
+            self.cold_hits += 1
+        return record
+
+    def insert(self, record: dict):
+        _check_fields(record)
+        self._hot[record["reference"]] = Transaction.from_dict(record)
+        self._hot.move_to_end(record["reference"])
+        self._enforce_size()
+
+    def insert_many(self, records: Iterable[dict]):
+        for record in records:
+            self.insert(record)
+
+    def update(self, reference: str, **fields) -> bool:
+        _check_fields(fields)
+        record = self._hot.get(reference)
+        if record is None:
+            record = self._promote(reference)
+            if record is None:
+                return False
+        else:
+            self._hot.move_to_end(reference)
+        record.update(fields, skip_none=False)
+        return True
+
+    def update_many(self, updates: Iterable[Tuple[str, dict]]) -> int:
+        return sum(1 for reference, fields in updates if self.update(reference, **fields))
+
+    def delete_many(self, references: Iterable[str]) -> int:
+        references = list(references)
+        cold = [reference for reference in references if self._hot.pop(reference, None) is None]
+        return len(references) - len(cold) + (self.cold.delete_many(cold) if cold else 0)
+
+    def list(self, limit=100, offset=0, status=None, email=None, created_from=None, created_to=None) -> List[dict]:
+        hot = [record.to_record() for record in self._hot.values() if _matches(
+            record, status, email, to_epoch_ms(created_from), to_epoch_ms(created_to)
+        )]
+        cold = self.cold.list(
+            limit=offset + limit, status=status, email=email,
+            created_from=created_from, created_to=created_to
+        )
+        merged = sorted(
+            hot + cold,
+            key=lambda record: (to_epoch_ms(record.get("created_at")) or 0, record["reference"]),
+            reverse=True
+        )
+        return merged[offset:offset + limit]
+
+    def scan(self, after=None, limit=1000, created_from=None, created_to=None) -> List[dict]:
+        start = to_epoch_ms(created_from)
+        end = to_epoch_ms(created_to)
+        hot = heapq.nsmallest(limit, (
+            record for record in list(self._hot.values())
+            if (after is None or record.reference > after)
+            and (start is None or (record.created_at or 0) >= start)
+            and (end is None or (record.created_at or 0) <= end)
+        ), key=lambda record: record.reference)
+        cold = self.cold.scan(after=after, limit=limit, created_from=created_from, created_to=created_to)
+        merged = heapq.merge([record.to_record() for record in hot], cold, key=lambda record: record["reference"])
+        return list(itertools.islice(merged, limit))
+
+    def due_for_check(self, created_from, created_to, now, limit) -> List[dict]:
+        hot = _due_in_memory(
+            list(self._hot.values()), to_epoch_ms(created_from), to_epoch_ms(created_to), to_epoch_ms(now), limit
+        )
+        cold = self.cold.due_for_check(created_from, created_to, now, limit)
+        return heapq.nsmallest(limit, hot + cold, key=_check_priority)
+
+    def count(self) -> int:
+        return len(self._hot) + self.cold.count()
+
+    def stats(self) -> dict:
+        return {
+            "hot_size": len(self._hot),
+            "hot_max_size": self.max_size,
+            "cold_size": self.cold.count(),
+            "evictions": dict(self.evictions),
+            "cold_hits": self.cold_hits,
+            "promotions": self.promotions
+        }
+
+    def close(self):
+        self.cold.close()
+
+
+def create_store(
+    backend: str = "memory",
+    sqlite_path: str = "transactions.db",
+    **tier_options
+) -> TransactionStore:
+    """Build the configured transaction store"""
+    if backend == "sqlite":
+        return SQLiteTransactionStore(sqlite_path)
+    if backend == "memory":
+        return MemoryTransactionStore()
+    if backend == "tiered":
+        # The cold tier belongs to one process, so no change log to grow unread
+        return TieredTransactionStore(SQLiteTransactionStore(sqlite_path, change_log=False), **tier_options)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,179 @@
+"""
+Local mirror of Paystack transactions
+A background engine pulls new and changed transactions incrementally so
+listing can be served locally without a network round trip
+"""
+import asyncio
+import logging
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from export import iter_pages
+from models import Transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Paystack ISO timestamp such as 2024-01-01T10:00:00.000Z"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+class TransactionMirror:
+    """Compact transaction records keyed by reference, ordered by created_at"""
+
+    def __init__(self):
+        self._records: Dict[str, Transaction] = {}
+        self._order: List[Tuple[int, str]] = []  # (created_at epoch ms, reference), ascending
+        self.high_water_mark: Optional[str] = None
+        self.last_synced_at: Optional[float] = None
+        self.ready = False
+
+    def upsert(self, record: dict):
+        """Insert or merge a formatted transaction"""
+        reference = record.get("reference")
+        if not reference:
+            return
+
+        existing = self._records.get(reference)
+        if existing is None:
+            transaction = Transaction.from_dict(record)
+            if transaction.created_at is None:
+                transaction.created_at = int(time.time() * 1000)
+            self._records[reference] = transaction
+            insort(self._order, (transaction.created_at, reference))
+        else:
+            existing.update({k: v for k, v in record.items() if k != "created_at"})
+
+    def upsert_many(self, records: List[dict]):
+        for record in records:
+            self.upsert(record)
+
+    def remove(self, reference: str) -> bool:
+        """Drop a record (one Paystack never created)"""
+        record = self._records.pop(reference, None)
+        if record is None:
+            return False
+        key = (record.created_at, reference)
+        index = bisect_left(self._order, key)
+        if index < len(self._order) and self._order[index] == key:
+            del self._order[index]
+        return True
+
+    def get(self, reference: str) -> Optional[dict]:
+        record = self._records.get(reference)
+        return record.to_api() if record is not None else None
+
+    def page(self, page: int = 1, per_page: int = 10) -> dict:
+        """Newest-first page in the same shape as Paystack's list response"""
+        page = max(page, 1)
+        per_page = max(per_page, 1)
+        total = len(self._order)
+        end = total - (page - 1) * per_page
+        start = max(end - per_page, 0)
+        keys = self._order[start:end] if end > 0 else []
+        return {
+            "data": [self._records[reference].to_api() for _, reference in reversed(keys)],
+            "meta": {
+                "total": total,
+                "page": page,
+                "perPage": per_page,
+                "pageCount": (total + per_page - 1) // per_page
+            }
+        }
+
+    def __len__(self):
+        return len(self._records)
+
+
+class SyncEngine:
+    """Periodically pulls transactions created since the high-water mark"""
+
+    def __init__(
+        self,
+        mirror: TransactionMirror,
+        fetch_page: Callable[[dict], Awaitable[dict]],
+        interval: float = 30.0,
+        page_size: int = 100,
+        overlap: float = 3600.0,
+        window: int = 4
+    ):
+        self.mirror = mirror
+        self.fetch_page = fetch_page
+        self.interval = interval
+        self.page_size = page_size
+        self.overlap = overlap  # re-read recent history so status changes are picked up
+        self.window = window
+        self.runs = 0
+        self.failures = 0
+        self.records_synced = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def sync_once(self) -> int:
+        """Pull one incremental batch into the mirror, returning records seen"""
+        params = {"perPage": self.page_size}
+        since = parse_timestamp(self.mirror.high_water_mark)
+        if since is not None:
+            params["from"] = (since - timedelta(seconds=self.overlap)).isoformat()
+
+        count = 0
+        async for page in iter_pages(self.fetch_page, params, window=self.window):
+            self.mirror.upsert_many(page["data"])
+            count += len(page["data"])
+            newest = max((r["created_at"] for r in page["data"] if r.get("created_at")), default=None)
+            if newest and (self.mirror.high_water_mark is None or newest > self.mirror.high_water_mark):
+                self.mirror.high_water_mark = newest
+
+        self.mirror.last_synced_at = time.time()
+        self.mirror.ready = True
+        self.runs += 1
+        self.records_synced += count
+        return count
+
+    async def run(self):
+        while True:
+            try:
+                await self.sync_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning("Transaction sync failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        last = self.mirror.last_synced_at
+        return {
+            "ready": self.mirror.ready,
+            "records": len(self.mirror),
+            "high_water_mark": self.mirror.high_water_mark,
+            "sync_lag_seconds": round(time.time() - last, 3) if last else None,
+            "runs": self.runs,
+            "failures": self.failures,
+            "records_synced": self.records_synced,
+            "last_error": self.last_error
+        }
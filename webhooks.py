@@ -0,0 +1,371 @@
+"""
+Webhook ingestion
+Verified webhook bodies are appended to a durable SQLite queue and
+acknowledged straight away; a pool of async consumers applies them later
+with at-least-once semantics
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from codec import loads
+
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookQueue:
+    """Durable FIFO of raw webhook bodies with leases for at-least-once delivery"""
+
+    def __init__(self, path: str = "webhook_queue.db", lease_seconds: float = 30.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # survives process crashes
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS webhook_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                body BLOB NOT NULL,
+                received_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_webhook_events_available ON webhook_events (available_at);
+        """)
+
+    def append(self, body: bytes) -> int:
+        """Persist one raw event body; returns its queue id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO webhook_events (body, received_at, available_at) VALUES (?, ?, ?)",
+                (body, now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self, limit: int = 10) -> List[Tuple[int, bytes, float, int]]:
+        """Lease up to `limit` available events as (id, body, received_at, attempts)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # serialize claims across workers
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, body, received_at, attempts FROM webhook_events "
+                    "WHERE available_at <= ? ORDER BY id LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE webhook_events SET available_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(row[0], row[1], row[2], row[3] + 1) for row in rows]
+
+    def renew(self, event_id: int, attempts: int) -> bool:
+        """
+        Restart the lease on a claimed event. False if it was claimed again
+        since (every claim bumps attempts), so the caller no longer owns it.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE webhook_events SET available_at = ? WHERE id = ? AND attempts = ?",
+                (time.time() + self.lease_seconds, event_id, attempts)
+            ).rowcount > 0
+
+    def ack(self, event_id: int):
+        """Remove a successfully applied event"""
+        with self._lock:
+            self._conn.execute("DELETE FROM webhook_events WHERE id = ?", (event_id,))
+
+    def retry(self, event_id: int, delay: float):
+        """Make a failed event available again after `delay` seconds"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE webhook_events SET available_at = ? WHERE id = ?",
+                (time.time() + delay, event_id)
+            )
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM webhook_events").fetchone()[0]
+
+    def oldest_received_at(self) -> Optional[float]:
+        with self._lock:
+            return self._conn.execute("SELECT MIN(received_at) FROM webhook_events").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EventRouter:
+    """
+    O(1) dispatch from event type to registered handlers. All handlers for
+    one event run concurrently, each under its own timeout, with per-handler
+    call counts and latency tracked.
+    """
+
+    def __init__(self, default_timeout: float = 5.0):
+        self.default_timeout = default_timeout
+        self._routes: dict = defaultdict(list)  # event type -> [(name, handler, timeout)]
+        self._latencies: dict = defaultdict(lambda: deque(maxlen=500))
+        self.calls = defaultdict(int)
+        self.failures = defaultdict(int)
+        self.timeouts = defaultdict(int)
+        self.unrouted = defaultdict(int)
+
+    def register(self, *event_types: str, name: Optional[str] = None, timeout: Optional[float] = None):
+        """Decorator registering an async handler(event, received_at) for event types"""
+        def decorator(handler: Callable[[dict, float], Awaitable[None]]):
+            handler_name = name or handler.__name__
+            for event_type in event_types:
+                self._routes[event_type].append((handler_name, handler, timeout or self.default_timeout))
+            return handler
+        return decorator
+
+    async def _run(self, event_type: str, name: str, handler, timeout: float, event: dict, received_at: float):
+        key = f"{event_type}:{name}"
+        self.calls[key] += 1
+        began = time.perf_counter()
+        try:
+            await asyncio.wait_for(handler(event, received_at), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[key] += 1
+            raise
+        except Exception:
+            self.failures[key] += 1
+            raise
+        finally:
+            self._latencies[key].append(time.perf_counter() - began)
+
+    async def dispatch(self, event: dict, received_at: float):
+        """Run every handler for the event; raise if any of them failed"""
+        event_type = event.get("event") or "unknown"
+        handlers = self._routes.get(event_type)
+        if not handlers:
+            self.unrouted[event_type] += 1
+            return
+
+        results = await asyncio.gather(
+            *(self._run(event_type, name, handler, timeout, event, received_at) for name, handler, timeout in handlers),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # Surface the failure so the queue redelivers (handlers are idempotent)
+            raise RuntimeError(f"{len(errors)} handler(s) failed for {event_type}: {errors[0]!r}")
+
+    def stats(self) -> dict:
+        handlers = {}
+        for key, samples in self._latencies.items():
+            ordered = sorted(samples)
+            handlers[key] = {
+                "calls": self.calls[key],
+                "failures": self.failures[key],
+                "timeouts": self.timeouts[key],
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3) if ordered else 0.0
+            }
+        return {
+            "routes": {event_type: [name for name, _, _ in routes] for event_type, routes in self._routes.items()},
+            "handlers": handlers,
+            "unrouted": dict(self.unrouted)
+        }
+
+
+def event_key(event: dict) -> Optional[str]:
+    """Dedupe key: event type plus the reference (or id) it concerns"""
+    data = event.get("data") or {}
+    subject = data.get("reference") or data.get("id")
+    if subject is None:
+        return None
+    return f"{event.get('event')}:{subject}"
+
+
+class EventDeduplicator:
+    """
+    Bounded, time-windowed index of recently applied event keys.
+    Keys are kept in insertion order, so expiry and size eviction only ever
+    pop from the front and every operation is O(1) amortized.
+    """
+
+    def __init__(self, window: float = 86400.0, max_size: int = 1000000, bucket_seconds: float = 60.0):
+        self.window = window
+        self.max_size = max_size
+        self.bucket_seconds = bucket_seconds
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._duplicate_buckets: deque = deque(maxlen=60)  # [bucket_start, count]
+        self.duplicates = 0
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if seen_at >= cutoff and len(self._seen) <= self.max_size:
+                break
+            self._seen.popitem(last=False)
+
+    def is_duplicate(self, key: Optional[str]) -> bool:
+        if key is None:
+            return False
+        now = time.time()
+        seen_at = self._seen.get(key)
+        if seen_at is None or seen_at < now - self.window:
+            return False
+
+        self.duplicates += 1
+        bucket = now - now % self.bucket_seconds
+        if self._duplicate_buckets and self._duplicate_buckets[-1][0] == bucket:
+            self._duplicate_buckets[-1][1] += 1
+        else:
+            self._duplicate_buckets.append([bucket, 1])
+        return True
+
+    def add(self, key: Optional[str]):
+        if key is None:
+            return
+        now = time.time()
+        self._seen[key] = now
+        self._seen.move_to_end(key)
+        self._expire(now)
+
+    def stats(self) -> dict:
+        return {
+            "tracked_keys": len(self._seen),
+            "max_size": self.max_size,
+            "window_seconds": self.window,
+            "duplicates": self.duplicates,
+            "duplicates_per_window": {
+                str(int(bucket)): count for bucket, count in self._duplicate_buckets
+            }
+        }
+
+
+class WebhookProcessor:
+    """Pool of async consumers draining the webhook queue"""
+
+    def __init__(
+        self,
+        queue: WebhookQueue,
+        handler: Callable[[dict, float], Awaitable[None]],
+        workers: int = 4,
+        batch_size: int = 10,
+        poll_interval: float = 1.0,
+        max_attempts: int = 10,
+        deduplicator: Optional[EventDeduplicator] = None
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.deduplicator = deduplicator or EventDeduplicator()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.processed = defaultdict(int)
+        self.failed = defaultdict(int)
+        self.dead_lettered = 0
+        self._recent: deque = deque(maxlen=1000)  # (finished_at, event_type, lag)
+
+    def enqueue(self, body: bytes) -> int:
+        """Persist a verified body and wake a consumer"""
+        event_id = self.queue.append(body)
+        self._wakeup.set()
+        return event_id
+
+    async def _consume(self):
+        while True:
+            self._wakeup.clear()
+            events = self.queue.claim(self.batch_size)
+            if not events:
+                # Sleep until new work arrives (or poll for expired leases)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # The batch shares one lease but is applied one event at a time,
+            # so each event's lease is restarted just before it is applied
+            for event_id, body, received_at, attempts in events:
+                if not self.queue.renew(event_id, attempts):
+                    continue  # lease expired and another consumer took it
+                await self._apply(event_id, body, received_at, attempts)
+
+    async def _apply(self, event_id: int, body: bytes, received_at: float, attempts: int):
+        try:
+            event = loads(body)
+            event_type = event.get("event") or "unknown"
+        except (ValueError, AttributeError):
+            logger.error("Dropping malformed webhook event %s", event_id)
+            self.dead_lettered += 1
+            self.queue.ack(event_id)
+            return
+
+        # Paystack redelivers; drop events already applied before touching state
+        key = event_key(event)
+        if self.deduplicator.is_duplicate(key):
+            self.queue.ack(event_id)
+            return
+
+        try:
+            await self.handler(event, received_at)
+        except asyncio.CancelledError:
+            raise  # lease expires and the event is redelivered
+        except Exception as e:
+            self.failed[event_type] += 1
+            if attempts >= self.max_attempts:
+                logger.error("Dropping webhook event %s after %s attempts: %s", event_id, attempts, e)
+                self.dead_lettered += 1
+                self.queue.ack(event_id)
+            else:
+                logger.warning("Webhook event %s failed (attempt %s): %s", event_id, attempts, e)
+                self.queue.retry(event_id, delay=min(2 ** attempts, 300))
+            return
+
+        self.deduplicator.add(key)
+        self.queue.ack(event_id)
+        now = time.time()
+        self.processed[event_type] += 1
+        self._recent.append((now, event_type, now - received_at))
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        now = time.time()
+        oldest = self.queue.oldest_received_at()
+        last_minute = [entry for entry in self._recent if now - entry[0] <= 60]
+        throughput = defaultdict(int)
+        for _, event_type, _ in last_minute:
+            throughput[event_type] += 1
+        lags = [lag for _, _, lag in self._recent]
+        return {
+            "queue_depth": self.queue.depth(),
+            "oldest_event_age_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "avg_processing_lag_seconds": round(sum(lags) / len(lags), 4) if lags else 0.0,
+            "processed": dict(self.processed),
+            "failed": dict(self.failed),
+            "dead_lettered": self.dead_lettered,
+            "per_minute": {event_type: count for event_type, count in throughput.items()},
+            "workers": len(self._tasks),
+            "dedupe": self.deduplicator.stats()
+        }